@@ -1,5 +1,28 @@
 import sqlite3
 import random
+import threading
+import atexit
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import hmac
+import secrets
+import argparse
+import queue
+import heapq
+import bisect
+import functools
+import itertools
+import re
+import unicodedata
+import weakref
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 
 # -----------------------------------
@@ -7,16 +30,304 @@ from pathlib import Path
 # -----------------------------------
 DB_PATH = "quizcode.db"
 
-def conectar():
-    return sqlite3.connect(DB_PATH)
+# Ajustes aplicados em toda conexão nova
+SYNCHRONOUS_PADRAO = "NORMAL"  # lotes com aguardar=True usam FULL (ver gravar_particao)
+PRAGMAS = (
+    ("journal_mode", "WAL"),    # leitores não bloqueiam o escritor
+    ("synchronous", SYNCHRONOUS_PADRAO),  # com WAL, fsync só no checkpoint
+    ("cache_size", -16000),     # ~16 MB de cache de páginas por conexão
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", 5000),     # espera até 5 s antes de "database is locked"
+)
+CACHE_COMANDOS = 256  # comandos preparados mantidos por conexão
 
 # -----------------------------------
-# CRIAÇÃO DAS TABELAS
+# MÉTRICAS E INSTRUMENTAÇÃO
 # -----------------------------------
-def criar_tabelas():
-    db = conectar()
-    cursor = db.cursor()
+LIMITES_HISTOGRAMA = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LIMITE_CONSULTA_LENTA = 0.05  # segundos
+MAX_CONSULTAS_LENTAS = 200
+INTERVALO_EXPORTACAO = 15     # segundos entre gravações do arquivo de métricas
+
+class Histograma:
+    __slots__ = ("baldes", "soma", "total", "erros", "lock")
+
+    def __init__(self):
+        self.baldes = [0] * (len(LIMITES_HISTOGRAMA) + 1)
+        self.soma = 0.0
+        self.total = 0
+        self.erros = 0
+        self.lock = threading.Lock()
+
+    def observar(self, segundos, erro=False):
+        balde = bisect.bisect_left(LIMITES_HISTOGRAMA, segundos)
+        with self.lock:
+            self.baldes[balde] += 1
+            self.soma += segundos
+            self.total += 1
+            if erro:
+                self.erros += 1
+
+class Metricas:
+    """Latência, contagem e erros por operação, mais um log de consultas lentas."""
+
+    def __init__(self):
+        self._histogramas = {}
+        self._lock = threading.Lock()
+        self.consultas_lentas = deque(maxlen=MAX_CONSULTAS_LENTAS)
+        self.total_consultas_lentas = 0
+
+    def histograma(self, nome):
+        histograma = self._histogramas.get(nome)
+        if histograma is None:
+            with self._lock:
+                histograma = self._histogramas.setdefault(nome, Histograma())
+        return histograma
+
+    def registrar_consulta_lenta(self, sql, segundos, plano):
+        self.total_consultas_lentas += 1
+        self.consultas_lentas.append({
+            "sql": " ".join(sql.split()),
+            "segundos": segundos,
+            "plano": plano,
+            "quando": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        })
+
+    def exportar_prometheus(self, extras=()):
+        linhas = [
+            "# HELP quiz_operacao_segundos Latência das operações do quiz.",
+            "# TYPE quiz_operacao_segundos histogram",
+        ]
+        erros = []
+        for nome, h in sorted(self._histogramas.items()):
+            with h.lock:
+                baldes, soma, total, qtd_erros = list(h.baldes), h.soma, h.total, h.erros
+            acumulado = 0
+            for limite, quantidade in zip(LIMITES_HISTOGRAMA + ("+Inf",), baldes):
+                acumulado += quantidade
+                linhas.append(f'quiz_operacao_segundos_bucket{{operacao="{nome}",le="{limite}"}} {acumulado}')
+            linhas.append(f'quiz_operacao_segundos_sum{{operacao="{nome}"}} {soma:.6f}')
+            linhas.append(f'quiz_operacao_segundos_count{{operacao="{nome}"}} {total}')
+            erros.append(f'quiz_operacao_erros_total{{operacao="{nome}"}} {qtd_erros}')
+
+        linhas += ["# HELP quiz_operacao_erros_total Operações que terminaram com exceção.",
+                   "# TYPE quiz_operacao_erros_total counter"] + erros
+        linhas += ["# HELP quiz_consultas_lentas_total Consultas SQL acima do limite de lentidão.",
+                   "# TYPE quiz_consultas_lentas_total counter",
+                   f"quiz_consultas_lentas_total {self.total_consultas_lentas}"]
+        for nome, tipo, ajuda, valores in extras:
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+            for rotulos, valor in valores:
+                rotulos = ",".join(f'{chave}="{v}"' for chave, v in rotulos.items())
+                linhas.append(f"{nome}{{{rotulos}}} {valor}" if rotulos else f"{nome} {valor}")
+        return "\n".join(linhas) + "\n"
+
+metricas = Metricas()
+
+def instrumentado(nome):
+    """Registra a duração (e se houve exceção) de cada chamada em `metricas`."""
+    def decorador(funcao):
+        histograma = metricas.histograma(nome)
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            inicio = time.perf_counter()
+            erro = True
+            try:
+                resultado = funcao(*args, **kwargs)
+                erro = False
+                return resultado
+            finally:
+                histograma.observar(time.perf_counter() - inicio, erro)
+        return envoltorio
+    return decorador
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor que guarda no log as consultas mais lentas que o limite."""
+
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            duracao = time.perf_counter() - inicio
+            if duracao >= LIMITE_CONSULTA_LENTA:
+                self._registrar_lenta(sql, parametros, duracao)
+
+    def executemany(self, sql, parametros):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            duracao = time.perf_counter() - inicio
+            if duracao >= LIMITE_CONSULTA_LENTA:
+                self._registrar_lenta(sql, None, duracao)
+
+    def _registrar_lenta(self, sql, parametros, duracao):
+        plano = None
+        if parametros is not None and not sql.lstrip().upper().startswith(("PRAGMA", "EXPLAIN")):
+            try:
+                plano = [linha[-1] for linha in self.connection.cursor(sqlite3.Cursor).execute(
+                    "EXPLAIN QUERY PLAN " + sql, parametros)]
+            except sqlite3.Error:
+                pass
+        metricas.registrar_consulta_lenta(sql, duracao, plano)
+
+class ConexaoInstrumentada(sqlite3.Connection):
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+class ExportadorMetricas:
+    """Grava periodicamente as métricas em formato Prometheus num arquivo
+    (para o textfile collector do node_exporter, por exemplo)."""
+
+    def __init__(self, caminho, intervalo=INTERVALO_EXPORTACAO):
+        self.caminho = Path(caminho)
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="exportador-metricas", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+        atexit.register(self.parar)
+        return self
+
+    def parar(self):
+        self._parar.set()
+        self.gravar()
+
+    def gravar(self):
+        temporario = self.caminho.with_name(self.caminho.name + ".tmp")
+        temporario.write_text(exportar_metricas(), encoding="utf-8")
+        os.replace(temporario, self.caminho)
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self.gravar()
+
+class ConexaoDaThread:
+    """Conexão de uma thread; fecha-se sozinha quando a thread termina."""
+
+    __slots__ = ("db", "pid", "profundidade", "__weakref__")
+
+    def __init__(self, db, pid):
+        self.db = db
+        self.pid = pid
+        self.profundidade = 0
+
+class GerenciadorConexoes:
+    """Mantém uma conexão aberta por thread para um arquivo de banco.
+
+    Usado como gerenciador de contexto, devolve a conexão da thread atual e
+    faz commit (ou rollback, em caso de erro) ao sair do bloco mais externo.
+    A conexão fica no threading.local da thread: quando a thread termina,
+    o registro é coletado e a conexão é fechada.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._abertas = {}  # chave -> (pid, conexão)
+        self._chaves = itertools.count()
+        self._lock = threading.Lock()
+
+    @instrumentado("abrir_conexao")
+    def _abrir(self):
+        db = sqlite3.connect(
+            self.caminho,
+            cached_statements=CACHE_COMANDOS,
+            check_same_thread=False,
+            factory=ConexaoInstrumentada,
+        )
+        for nome, valor in PRAGMAS:
+            db.execute(f"PRAGMA {nome}={valor}")
+        return db
 
+    def _conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        pid = os.getpid()
+        # Após um fork a conexão herdada não pode ser reaproveitada
+        if conexao is None or conexao.pid != pid:
+            conexao = ConexaoDaThread(self._abrir(), pid)
+            chave = next(self._chaves)
+            with self._lock:
+                self._abertas[chave] = (pid, conexao.db)
+            # Na saída do programa quem fecha é fechar_conexoes, depois dos
+            # outros handlers do atexit que ainda gravam
+            weakref.finalize(conexao, self._descartar, chave).atexit = False
+            self._local.conexao = conexao
+        return conexao
+
+    def _descartar(self, chave):
+        with self._lock:
+            aberta = self._abertas.pop(chave, None)
+        if aberta is not None and aberta[0] == os.getpid():
+            aberta[1].close()
+
+    def obter(self):
+        return self._conexao().db
+
+    def fechar_todas(self):
+        pid = os.getpid()
+        with self._lock:
+            abertas, self._abertas = self._abertas, {}
+        for dono, db in abertas.values():
+            if dono == pid:
+                db.close()
+        self._local = threading.local()
+
+    def __enter__(self):
+        conexao = self._conexao()
+        conexao.profundidade += 1
+        return conexao.db
+
+    def __exit__(self, tipo, valor, tb):
+        conexao = self._local.conexao
+        conexao.profundidade -= 1
+        if conexao.profundidade == 0:
+            if tipo is None:
+                inicio = time.perf_counter()
+                try:
+                    conexao.db.commit()
+                except BaseException:
+                    # Não deixa a conexão da thread presa numa transação aberta
+                    conexao.db.rollback()
+                    raise
+                _histograma_commit.observar(time.perf_counter() - inicio)
+            else:
+                conexao.db.rollback()
+        return False
+
+_histograma_commit = metricas.histograma("commit")
+_gerenciadores = {}
+_gerenciadores_lock = threading.Lock()
+
+@instrumentado("conectar")
+def conectar(caminho=None):
+    caminho = caminho or DB_PATH
+    gerenciador = _gerenciadores.get(caminho)
+    if gerenciador is None:
+        with _gerenciadores_lock:
+            gerenciador = _gerenciadores.setdefault(caminho, GerenciadorConexoes(caminho))
+    return gerenciador
+
+def fechar_conexoes():
+    for gerenciador in list(_gerenciadores.values()):
+        gerenciador.fechar_todas()
+
+atexit.register(fechar_conexoes)
+
+# -----------------------------------
+# MIGRAÇÕES DO ESQUEMA (PRAGMA user_version)
+# -----------------------------------
+def _migracao_esquema_inicial(cursor):
+    # Idempotente: também adota bancos criados antes das migrações existirem
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS usuarios (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,149 +358,1325 @@ def criar_tabelas():
             FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
         )
     """)
+    colunas = {linha[1] for linha in cursor.execute("PRAGMA table_info(resultados)")}
+    if "nivel" not in colunas:
+        cursor.execute("ALTER TABLE resultados ADD COLUMN nivel TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_resultados_data ON resultados(data_hora)")
+
+    # Contador de versão das questões, incrementado por gatilhos a cada
+    # alteração (inclusive feitas por outros processos)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS versoes (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO versoes (tabela, versao) VALUES ('questoes', 0)")
+    for evento in ("INSERT", "UPDATE", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS questoes_versao_{evento.lower()}
+            AFTER {evento} ON questoes
+            BEGIN
+                UPDATE versoes SET versao = versao + 1 WHERE tabela = 'questoes';
+            END
+        """)
+
+    # Hash do conteúdo, usado para tornar as importações idempotentes
+    colunas = {linha[1] for linha in cursor.execute("PRAGMA table_info(questoes)")}
+    if "hash" not in colunas:
+        cursor.execute("ALTER TABLE questoes ADD COLUMN hash TEXT")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_questoes_hash ON questoes(hash)")
+    pendentes = cursor.execute(
+        "SELECT id, pergunta, alternativaA, alternativaB, alternativaC, alternativaD FROM questoes WHERE hash IS NULL"
+    ).fetchall()
+    cursor.executemany(
+        "UPDATE OR IGNORE questoes SET hash=? WHERE id=?",
+        [(hash_questao(*q[1:]), q[0]) for q in pendentes],
+    )
+
+    # Estatísticas por usuário mantidas a cada resultado gravado
+    criar_estatisticas = not cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='estatisticas_usuario'"
+    ).fetchone()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS estatisticas_usuario (
+            usuario_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL,
+            soma INTEGER NOT NULL,
+            minima INTEGER NOT NULL,
+            maxima INTEGER NOT NULL,
+            ultimas TEXT NOT NULL DEFAULT ''
+        )
+    """)
+    if criar_estatisticas:
+        _reconstruir_estatisticas_em(cursor)
+
+    # Cada resposta dada em um teste, gravada junto com o resultado
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS respostas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            resultado_id INTEGER NOT NULL,
+            usuario_id INTEGER,
+            questao_id INTEGER NOT NULL,
+            escolhida TEXT NOT NULL,
+            correta INTEGER NOT NULL,
+            tempo_ms INTEGER,
+            FOREIGN KEY (resultado_id) REFERENCES resultados(id),
+            FOREIGN KEY (questao_id) REFERENCES questoes(id)
+        )
+    """)
+
+    # Somatórios por questão para a análise incremental de dificuldade
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS estatisticas_questao (
+            questao_id INTEGER PRIMARY KEY,
+            respostas INTEGER NOT NULL,
+            acertos INTEGER NOT NULL,
+            escolhas_a INTEGER NOT NULL,
+            escolhas_b INTEGER NOT NULL,
+            escolhas_c INTEGER NOT NULL,
+            escolhas_d INTEGER NOT NULL,
+            soma_resto INTEGER NOT NULL,
+            soma_resto2 INTEGER NOT NULL,
+            soma_acerto_resto INTEGER NOT NULL,
+            soma_tempo_ms INTEGER NOT NULL
+        )
+    """)
+
+    # Sessões de quiz despejadas da memória
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sessoes (
+            usuario_id INTEGER PRIMARY KEY,
+            quiz BLOB,
+            respostas BLOB,
+            tempos BLOB,
+            ultimo_quiz BLOB,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Bitset das questões já sorteadas para cada usuário
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS questoes_vistas (
+            usuario_id INTEGER PRIMARY KEY,
+            mapa BLOB NOT NULL,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Progresso das importações, para retomar após uma falha
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS importacoes (
+            arquivo TEXT PRIMARY KEY,
+            assinatura TEXT NOT NULL,
+            posicao INTEGER NOT NULL DEFAULT 0,
+            concluida INTEGER NOT NULL DEFAULT 0,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Banco antigo com questões cadastradas antes dos gatilhos de versão:
+    # a versão diferente de zero indica que não há semeadura pendente
+    cursor.execute("""
+        UPDATE versoes SET versao = versao + 1
+        WHERE tabela = 'questoes' AND versao = 0 AND EXISTS (SELECT 1 FROM questoes)
+    """)
+
+def _migracao_indices_consulta(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_resultados_usuario ON resultados(usuario_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_questoes_nivel ON questoes(nivel)")
+
+def _migracao_particoes(cursor):
+    # Arquivos que recebem os resultados quando o particionamento está ligado
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS particoes_resultados (
+            indice INTEGER PRIMARY KEY,
+            caminho TEXT NOT NULL
+        )
+    """)
+
+def _migracao_busca_e_duplicatas(cursor):
+    # Índice de texto completo sobre a própria tabela questoes (content=),
+    # mantido pelos gatilhos abaixo
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS questoes_fts USING fts5(
+                pergunta, alternativaA, alternativaB, alternativaC, alternativaD,
+                content='questoes', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as erro:
+        print(f"⚠ Busca textual indisponível (SQLite sem FTS5): {erro}")
+    else:
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS questoes_fts_insert AFTER INSERT ON questoes BEGIN
+                INSERT INTO questoes_fts (rowid, pergunta, alternativaA, alternativaB, alternativaC, alternativaD)
+                VALUES (new.id, new.pergunta, new.alternativaA, new.alternativaB, new.alternativaC, new.alternativaD);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS questoes_fts_delete AFTER DELETE ON questoes BEGIN
+                INSERT INTO questoes_fts (questoes_fts, rowid, pergunta, alternativaA, alternativaB, alternativaC, alternativaD)
+                VALUES ('delete', old.id, old.pergunta, old.alternativaA, old.alternativaB, old.alternativaC, old.alternativaD);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS questoes_fts_update AFTER UPDATE ON questoes BEGIN
+                INSERT INTO questoes_fts (questoes_fts, rowid, pergunta, alternativaA, alternativaB, alternativaC, alternativaD)
+                VALUES ('delete', old.id, old.pergunta, old.alternativaA, old.alternativaB, old.alternativaC, old.alternativaD);
+                INSERT INTO questoes_fts (rowid, pergunta, alternativaA, alternativaB, alternativaC, alternativaD)
+                VALUES (new.id, new.pergunta, new.alternativaA, new.alternativaB, new.alternativaC, new.alternativaD);
+            END
+        """)
+        cursor.execute("INSERT INTO questoes_fts (questoes_fts) VALUES ('rebuild')")
+
+    # Detecção de quase duplicatas: vocabulário das perguntas, baldes LSH
+    # (banda, chave) e o grupo de cada questão que tem alguma parecida
+    cursor.execute("CREATE TABLE IF NOT EXISTS termos_questoes (termo TEXT PRIMARY KEY) WITHOUT ROWID")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lsh_questoes (
+            banda INTEGER NOT NULL,
+            chave INTEGER NOT NULL,
+            questao_id INTEGER NOT NULL,
+            PRIMARY KEY (banda, chave, questao_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS grupos_questoes (
+            questao_id INTEGER PRIMARY KEY,
+            grupo INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_grupos_questoes_grupo ON grupos_questoes(grupo)")
+    # Linhas de lsh_questoes de questões removidas ficam para trás; são
+    # descartadas na verificação dos candidatos e na próxima detecção em lote
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS grupos_questoes_delete AFTER DELETE ON questoes BEGIN
+            DELETE FROM grupos_questoes WHERE questao_id = old.id;
+        END
+    """)
+
+def _migracao_termos_por_questao(cursor):
+    # Conjunto de termos de cada questão, gravado na indexação, para que a
+    # verificação das candidatas não precise tokenizar as perguntas de novo
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS caracteristicas_questoes (
+            questao_id INTEGER PRIMARY KEY,
+            termos TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS caracteristicas_questoes_delete AFTER DELETE ON questoes BEGIN
+            DELETE FROM caracteristicas_questoes WHERE questao_id = old.id;
+        END
+    """)
+    _detectar_duplicatas_em(cursor.connection)
+
+# Ordem fixa: a migração na posição i leva o banco à versão i + 1.
+# Novas mudanças de esquema entram sempre no fim da lista.
+MIGRACOES = (
+    ("esquema inicial", _migracao_esquema_inicial),
+    ("índices de resultados por usuário e questões por nível", _migracao_indices_consulta),
+    ("tabela de partições de resultados", _migracao_particoes),
+    ("busca textual e grupos de questões quase duplicadas", _migracao_busca_e_duplicatas),
+    ("termos de cada questão para a detecção de duplicatas", _migracao_termos_por_questao),
+)
+VERSAO_ESQUEMA = len(MIGRACOES)
+
+def _migracao_particao_inicial(cursor):
+    # Mesmas colunas das tabelas do banco principal, sem as chaves
+    # estrangeiras (usuarios e questoes ficam em outro arquivo)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS resultados (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER,
+            nota INTEGER,
+            data_hora TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            nivel TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_resultados_data ON resultados(data_hora)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_resultados_usuario ON resultados(usuario_id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS estatisticas_usuario (
+            usuario_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL,
+            soma INTEGER NOT NULL,
+            minima INTEGER NOT NULL,
+            maxima INTEGER NOT NULL,
+            ultimas TEXT NOT NULL DEFAULT ''
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS respostas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            resultado_id INTEGER NOT NULL,
+            usuario_id INTEGER,
+            questao_id INTEGER NOT NULL,
+            escolhida TEXT NOT NULL,
+            correta INTEGER NOT NULL,
+            tempo_ms INTEGER,
+            FOREIGN KEY (resultado_id) REFERENCES resultados(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS estatisticas_questao (
+            questao_id INTEGER PRIMARY KEY,
+            respostas INTEGER NOT NULL,
+            acertos INTEGER NOT NULL,
+            escolhas_a INTEGER NOT NULL,
+            escolhas_b INTEGER NOT NULL,
+            escolhas_c INTEGER NOT NULL,
+            escolhas_d INTEGER NOT NULL,
+            soma_resto INTEGER NOT NULL,
+            soma_resto2 INTEGER NOT NULL,
+            soma_acerto_resto INTEGER NOT NULL,
+            soma_tempo_ms INTEGER NOT NULL
+        )
+    """)
+
+# Migrações dos arquivos de partição (resultados, respostas e somatórios)
+MIGRACOES_PARTICAO = (
+    ("esquema inicial da partição", _migracao_particao_inicial),
+)
+
+def versao_esquema(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+def migrar(caminho=None, migracoes=MIGRACOES):
+    """Aplica as migrações pendentes, cada uma em sua própria transação.
+
+    Com o esquema em dia custa só a leitura de PRAGMA user_version, que não
+    depende do tamanho do banco.
+    """
+    with conectar(caminho) as db:
+        if versao_esquema(db) >= len(migracoes):
+            return
+
+    for numero, (descricao, migracao) in enumerate(migracoes, 1):
+        with conectar(caminho) as db:
+            if not db.in_transaction:
+                db.execute("BEGIN IMMEDIATE")
+            # Outro processo pode ter migrado enquanto esperávamos o lock
+            if versao_esquema(db) >= numero:
+                continue
+            migracao(db.cursor())
+            db.execute(f"PRAGMA user_version = {numero}")
+        print(f"✓ Migração {numero} aplicada: {descricao}")
+
+def criar_tabelas():
+    migrar()
+    for caminho in caminhos_particoes():
+        if caminho != DB_PATH:
+            migrar(caminho, MIGRACOES_PARTICAO)
+
+# -----------------------------------
+# PARTIÇÕES DE RESULTADOS (SHARDS)
+# -----------------------------------
+THREADS_PARTICOES = 8
+
+_executor_particoes = ThreadPoolExecutor(max_workers=THREADS_PARTICOES, thread_name_prefix="particoes")
+_particoes = {}  # DB_PATH -> caminhos dos arquivos de partição
+
+def caminhos_particoes():
+    """Arquivos que guardam resultados e respostas.
+
+    Sem particionamento é só o banco principal. Com N partições, cada
+    usuário tem todos os seus resultados numa delas (ver particao_do_usuario).
+    """
+    caminhos = _particoes.get(DB_PATH)
+    if caminhos is None:
+        with conectar() as db:
+            linhas = db.execute("SELECT caminho FROM particoes_resultados ORDER BY indice").fetchall()
+        pasta = Path(DB_PATH).parent
+        caminhos = tuple(str(pasta / caminho) for caminho, in linhas) or (DB_PATH,)
+        _particoes[DB_PATH] = caminhos
+    return caminhos
+
+def particao_do_usuario(usuario_id, total=None):
+    total = total or len(caminhos_particoes())
+    # Com total potência de dois, o resultado depende só de usuario_id % total
+    # (em outra ordem): espalha tão bem quanto o resto, não melhor. Mudar a
+    # fórmula mudaria a partição dos usuários existentes
+    return ((usuario_id * 0x9E3779B1) & 0xFFFFFFFF) % total
+
+def caminho_do_usuario(usuario_id):
+    caminhos = caminhos_particoes()
+    return caminhos[particao_do_usuario(usuario_id, len(caminhos))]
+
+def em_paralelo(funcao, itens):
+    """Aplica `funcao` a cada item em threads separadas (sem threads se houver um só)."""
+    itens = list(itens)
+    if len(itens) == 1:
+        return [funcao(itens[0])]
+    futuros = []
+    for item in itens:
+        try:
+            futuros.append(_executor_particoes.submit(funcao, item))
+        except RuntimeError:
+            # Executor já desligado no encerramento do interpretador: roda aqui
+            futuros.append(None)
+    return [funcao(item) if futuro is None else futuro.result() for futuro, item in zip(futuros, itens)]
+
+# -----------------------------------
+# IMPORTAÇÃO DE QUESTÕES (JSONL/CSV)
+# -----------------------------------
+ARQUIVO_QUESTOES_PADRAO = Path(__file__).with_name("dados") / "questoes.jsonl"
+NIVEIS = ("basico", "intermediario", "avancado")
+CAMPOS_QUESTAO = ("pergunta", "alternativaA", "alternativaB", "alternativaC", "alternativaD", "correta", "nivel")
+TAMANHO_LOTE_IMPORTACAO = 5000
+MAX_ERROS_EXIBIDOS = 20
+
+SQL_UPSERT_QUESTAO = """
+    INSERT INTO questoes (pergunta, alternativaA, alternativaB, alternativaC, alternativaD, correta, nivel, hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(hash) DO UPDATE SET correta = excluded.correta, nivel = excluded.nivel
+    WHERE correta IS NOT excluded.correta OR nivel IS NOT excluded.nivel
+"""
+
+def hash_questao(pergunta, alternativaA, alternativaB, alternativaC, alternativaD):
+    conteudo = "\x1f".join(
+        " ".join((texto or "").split()).lower()
+        for texto in (pergunta, alternativaA, alternativaB, alternativaC, alternativaD)
+    )
+    return hashlib.blake2b(conteudo.encode("utf-8"), digest_size=16).hexdigest()
+
+def ler_registros(caminho):
+    """Gera (número do registro, dict) a partir de um arquivo JSONL ou CSV."""
+    caminho = Path(caminho)
+    with open(caminho, encoding="utf-8", newline="") as arquivo:
+        if caminho.suffix.lower() == ".csv":
+            yield from enumerate(csv.DictReader(arquivo), 1)
+            return
+        for numero, linha in enumerate(arquivo, 1):
+            if not linha.strip():
+                continue
+            try:
+                yield numero, json.loads(linha)
+            except json.JSONDecodeError as erro:
+                yield numero, erro
+
+def validar_questao(registro):
+    if not isinstance(registro, dict):
+        raise ValueError(f"registro ilegível ({registro})")
+    valores = [str(registro.get(campo) or "").strip() for campo in CAMPOS_QUESTAO]
+    pergunta, *alternativas, correta, nivel = valores
+    correta = correta.upper()
+    nivel = nivel.lower()
+    if not pergunta:
+        raise ValueError("pergunta vazia")
+    if not all(alternativas):
+        raise ValueError("alternativa vazia")
+    if correta not in LETRAS:
+        raise ValueError(f"resposta '{correta}' não está entre A e D")
+    if nivel not in NIVEIS:
+        raise ValueError(f"nível '{nivel}' inválido")
+    return (pergunta, *alternativas, correta, nivel, hash_questao(pergunta, *alternativas))
 
-    db.commit()
-    db.close()
+def validar_registros(registros, erros):
+    for numero, registro in registros:
+        try:
+            yield numero, validar_questao(registro)
+        except ValueError as erro:
+            erros[0] += 1
+            if erros[0] <= MAX_ERROS_EXIBIDOS:
+                print(f"\n✗ Registro {numero} ignorado: {erro}")
+
+def em_lotes(itens, tamanho):
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def importar_questoes(caminho, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, retomar=True, duplicatas=False):
+    """Importa um arquivo de questões em lotes, sem carregá-lo inteiro.
+
+    Cada lote é gravado numa transação junto com a posição alcançada, de modo
+    que uma importação interrompida continua de onde parou. Questões já
+    existentes (mesmo hash de conteúdo) são atualizadas em vez de duplicadas.
+    Com `duplicatas`, a detecção de quase duplicatas roda uma vez no fim;
+    sem ela, as questões importadas só entram nos grupos na próxima detecção.
+    """
+    caminho = Path(caminho).resolve()
+    info = caminho.stat()
+    assinatura = f"{info.st_size}:{info.st_mtime_ns}"
+
+    inicio = 0
+    with conectar() as db:
+        progresso = db.execute(
+            "SELECT assinatura, posicao, concluida FROM importacoes WHERE arquivo=?", (str(caminho),)
+        ).fetchone()
+    if retomar and progresso and progresso[0] == assinatura:
+        if progresso[2]:
+            print(f"✓ {caminho.name} já foi importado.")
+            return 0
+        inicio = progresso[1]
+        print(f"Retomando {caminho.name} a partir do registro {inicio + 1}...")
+
+    registros = ((n, r) for n, r in ler_registros(caminho) if n > inicio)
+    erros = [0]
+    gravadas = 0
+    posicao = inicio
+    comeco = time.perf_counter()
+
+    for lote in em_lotes(validar_registros(registros, erros), tamanho_lote):
+        posicao = lote[-1][0]
+        with conectar() as db:
+            cursor = db.cursor()
+            cursor.executemany(SQL_UPSERT_QUESTAO, [linha for _, linha in lote])
+            cursor.execute("""
+                INSERT INTO importacoes (arquivo, assinatura, posicao) VALUES (?, ?, ?)
+                ON CONFLICT(arquivo) DO UPDATE SET
+                    assinatura = excluded.assinatura, posicao = excluded.posicao,
+                    concluida = 0, atualizado_em = CURRENT_TIMESTAMP
+            """, (str(caminho), assinatura, posicao))
+        gravadas += len(lote)
+        taxa = gravadas / max(time.perf_counter() - comeco, 1e-9)
+        print(f"\r  {posicao} registros lidos, {gravadas} gravados ({taxa:.0f}/s)", end="", flush=True)
+
+    with conectar() as db:
+        db.execute("""
+            INSERT INTO importacoes (arquivo, assinatura, posicao, concluida) VALUES (?, ?, ?, 1)
+            ON CONFLICT(arquivo) DO UPDATE SET
+                assinatura = excluded.assinatura, posicao = excluded.posicao,
+                concluida = 1, atualizado_em = CURRENT_TIMESTAMP
+        """, (str(caminho), assinatura, posicao))
+
+    print(f"\n✓ {gravadas} questões importadas de {caminho.name}", end="")
+    print(f" ({erros[0]} registros inválidos)" if erros[0] else "")
+    if duplicatas and gravadas:
+        print(f"✓ {detectar_duplicatas()} grupos de quase duplicatas.")
+    return gravadas
 
 # -----------------------------------
-# POPULAR BANCO COM 100 QUESTÕES
+# POPULAR BANCO COM AS QUESTÕES PADRÃO
 # -----------------------------------
 def inserir_questoes():
-    db = conectar()
-    cursor = db.cursor()
+    # Versão zero: nenhuma questão jamais foi gravada neste banco
+    with conectar() as db:
+        if QuestionBank.versao_atual(db) > 0:
+            return
+
+    if ARQUIVO_QUESTOES_PADRAO.exists():
+        importar_questoes(ARQUIVO_QUESTOES_PADRAO, retomar=False, duplicatas=True)
+
+# -----------------------------------
+# BANCO DE QUESTÕES EM MEMÓRIA
+# -----------------------------------
+LETRAS = "ABCD"
+
+class Question:
+    """Registro compacto de uma questão; a resposta correta é guardada como 0-3."""
+
+    __slots__ = ("id", "pergunta", "alternativas", "correta", "nivel")
+
+    def __init__(self, id, pergunta, alternativas, correta, nivel):
+        self.id = id
+        self.pergunta = pergunta
+        self.alternativas = alternativas
+        self.correta = correta
+        self.nivel = nivel
+
+    @classmethod
+    def da_linha(cls, linha):
+        id_questao, pergunta, a, b, c, d, correta, nivel = linha
+        return cls(
+            id_questao,
+            pergunta,
+            (a, b, c, d),
+            LETRAS.find(correta or ""),
+            sys.intern(nivel) if nivel else nivel,
+        )
+
+    @property
+    def letra_correta(self):
+        return LETRAS[self.correta] if self.correta >= 0 else None
+
+class IndiceQuestoes:
+    """Ids das questões agrupados por nível, mantidos em memória.
+
+    Permite sortear k questões sem reposição em O(k), sem ordenar a tabela
+    inteira como faz ORDER BY RANDOM().
+    """
+
+    def __init__(self):
+        self._por_nivel = {}
+        self._todas = []
+        self._lock = threading.Lock()
+
+    def carregar(self, pares):
+        por_nivel = {}
+        todas = []
+        for id_questao, nivel in pares:
+            por_nivel.setdefault(nivel, []).append(id_questao)
+            todas.append(id_questao)
+        with self._lock:
+            self._por_nivel = por_nivel
+            self._todas = todas
+
+    def adicionar(self, id_questao, nivel):
+        with self._lock:
+            self._por_nivel.setdefault(nivel, []).append(id_questao)
+            self._todas.append(id_questao)
+
+    def populacao(self, nivel=None):
+        return self._por_nivel.get(nivel, []) if nivel else self._todas
+
+    def sortear(self, nivel=None, k=10):
+        ids = self.populacao(nivel)
+        # random.sample usa seleção por conjunto quando a população é grande: O(k)
+        return random.sample(ids, min(k, len(ids)))
+
+class EstadoQuestoes:
+    """Registros, índice por nível e grupos de duplicatas de uma mesma carga.
+
+    É trocado inteiro numa única atribuição, para que um sorteio concorrente
+    nunca combine o índice novo com o dicionário antigo.
+    """
+
+    __slots__ = ("questoes", "indice", "grupos")
+
+    def __init__(self, questoes=None, indice=None, grupos=None):
+        self.questoes = questoes if questoes is not None else {}
+        self.indice = indice if indice is not None else IndiceQuestoes()
+        self.grupos = grupos if grupos is not None else {}  # questao_id -> grupo de quase duplicatas
+
+class QuestionBank:
+    """Tabela questoes carregada uma única vez em registros Question.
+
+    Os quizzes apenas referenciam esses registros compartilhados. A tabela
+    versoes indica quando é preciso recarregar.
+    """
+
+    COLUNAS = "id, pergunta, alternativaA, alternativaB, alternativaC, alternativaD, correta, nivel"
+
+    def __init__(self):
+        self.estado = EstadoQuestoes()
+        self.versao = None
+        self._banco = None  # DB_PATH da última carga
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def versao_atual(db):
+        linha = db.execute("SELECT versao FROM versoes WHERE tabela = 'questoes'").fetchone()
+        return linha[0] if linha else 0
+
+    def atualizar(self, db):
+        versao = self.versao_atual(db)
+        if versao == self.versao and self._banco == DB_PATH:
+            return
+        with self._lock:
+            # Relida com o lock: durante uma importação a versão muda a cada
+            # linha, e quem esperou o lock não deve recarregar de novo à toa
+            versao = self.versao_atual(db)
+            if versao == 0:
+                # Banco novo: semeia as questões padrão no primeiro uso
+                inserir_questoes()
+                versao = self.versao_atual(db)
+            # A versão só cresce; menor ou igual à carregada não é novidade
+            if self._banco != DB_PATH or self.versao is None or versao > self.versao:
+                self._carregar(db, versao)
+
+    def _carregar(self, db, versao):
+        questoes = {}
+        for linha in db.execute(f"SELECT {self.COLUNAS} FROM questoes"):
+            questoes[linha[0]] = Question.da_linha(linha)
+        indice = IndiceQuestoes()
+        indice.carregar((q.id, q.nivel) for q in questoes.values())
+        grupos = dict(db.execute("SELECT questao_id, grupo FROM grupos_questoes"))
+        self.estado = EstadoQuestoes(questoes, indice, grupos)
+        self.versao = versao
+        self._banco = DB_PATH
+
+    def adicionar(self, questao, versao):
+        # Só aplica incrementalmente se nada mais mudou desde a última carga
+        with self._lock:
+            if self.versao is None or versao != self.versao + 1:
+                return
+            # O registro entra antes do id no índice: quem sorteia o id já o encontra
+            estado = self.estado
+            estado.questoes[questao.id] = questao
+            estado.indice.adicionar(questao.id, questao.nivel)
+            self.versao = versao
+
+    def sortear(self, nivel=None, k=10):
+        estado = self.estado
+        return [estado.questoes[i] for i in estado.indice.sortear(nivel, k)]
+
+    def sortear_ineditas(self, mapa, nivel=None, k=10, candidatos=(), evitar_duplicatas=True):
+        estado = self.estado
+        aceitar = self.filtro_grupos(estado) if evitar_duplicatas else None
+        ids = mapa.sortear(estado.indice.populacao(nivel), k, candidatos, aceitar)
+        return [estado.questoes[i] for i in ids]
+
+    def filtro_grupos(self, estado=None):
+        """Função aceitar(id) que recusa uma segunda questão do mesmo grupo de quase duplicatas."""
+        grupos = (estado or self.estado).grupos
+        if not grupos:
+            return None
+        usados = set()
+
+        def aceitar(id_questao):
+            grupo = grupos.get(id_questao)
+            if grupo is None:
+                return True
+            if grupo in usados:
+                return False
+            usados.add(grupo)
+            return True
+        return aceitar
+
+    def sem_duplicatas(self, quiz, nivel=None):
+        """Troca questões que repetem um grupo de quase duplicatas já presente no quiz."""
+        estado = self.estado
+        aceitar = self.filtro_grupos(estado)
+        if aceitar is None:
+            return quiz
+        mantidas, recusadas = [], []
+        for questao in quiz:
+            (mantidas if aceitar(questao.id) else recusadas).append(questao)
+        if not recusadas:
+            return quiz
+
+        questoes = estado.questoes
+        escolhidas = {q.id for q in quiz}
+        populacao = estado.indice.populacao(nivel)
+        for _ in range(TENTATIVAS_POR_QUESTAO * len(quiz)):
+            if len(mantidas) == len(quiz):
+                break
+            id_questao = populacao[random.randrange(len(populacao))]
+            if id_questao not in escolhidas and aceitar(id_questao):
+                escolhidas.add(id_questao)
+                mantidas.append(questoes[id_questao])
+        return mantidas + recusadas[:len(quiz) - len(mantidas)]
+
+    def obter(self, ids):
+        questoes = self.estado.questoes
+        return [questoes[i] for i in ids if i in questoes]
+
+_banco_questoes = QuestionBank()
+
+def cadastrar_questao(pergunta, alternativaA, alternativaB, alternativaC, alternativaD, correta, nivel):
+    linha = (pergunta, alternativaA, alternativaB, alternativaC, alternativaD, correta, nivel)
+    with conectar() as db:
+        cursor = db.cursor()
+        cursor.execute("""
+            INSERT INTO questoes (pergunta, alternativaA, alternativaB, alternativaC, alternativaD, correta, nivel, hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, linha + (hash_questao(*linha[:5]),))
+        id_questao = cursor.lastrowid
+        indexar_duplicatas(db, [(id_questao, pergunta)])
+        versao = QuestionBank.versao_atual(db)
+    _banco_questoes.adicionar(Question.da_linha((id_questao,) + linha), versao)
+    return id_questao
+
+# -----------------------------------
+# BUSCA TEXTUAL E QUASE DUPLICATAS
+# -----------------------------------
+PERMUTACOES_MINHASH = 128
+BANDAS_LSH = 32           # 32 bandas de 4 valores: viram candidatas a partir de ~40% de semelhança
+LIMIAR_DUPLICATA = 0.65   # Jaccard mínimo entre os termos de duas perguntas
+MAX_BALDE_LSH = 1000      # baldes maiores que isso são ignorados na detecção em lote
+PALAVRAS_VAZIAS = frozenset("""
+    a o as os um uma uns umas de do da dos das em no na nos nas ao aos e ou
+    que qual quais para por com se ser sao entre diferenca como mais nao
+""".split())
+SINAIS_IGNORADOS = set("?:.,!;()[]{}'\"-")
+
+_PRIMO_MINHASH = (1 << 61) - 1
+_sorteio_minhash = random.Random(1_000_003)
+_COEFICIENTES_MINHASH = [
+    (_sorteio_minhash.randrange(1, _PRIMO_MINHASH), _sorteio_minhash.randrange(_PRIMO_MINHASH))
+    for _ in range(PERMUTACOES_MINHASH)
+]
+
+def termos(texto):
+    """Termos normalizados de um texto: sem acentos, sem palavras vazias e no singular.
+
+    Operadores ("//", "%", "**") contam como termos, pois distinguem
+    perguntas como "10 // 3" e "10 % 3".
+    """
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    resultado = []
+    for termo in re.findall(r"[a-z0-9_]+|[^\sa-z0-9_]+", texto):
+        if not termo[0].isalnum() and termo[0] != "_":
+            termo = "".join(c for c in termo if c not in SINAIS_IGNORADOS)
+        if not termo or termo in PALAVRAS_VAZIAS:
+            continue
+        if len(termo) > 4 and termo.endswith("oes"):
+            termo = termo[:-3] + "ao"
+        elif len(termo) > 4 and termo.endswith("s") and not termo.endswith("ss"):
+            termo = termo[:-1]
+        resultado.append(termo)
+    return resultado
+
+def caracteristicas(pergunta, vocabulario):
+    """Conjunto de termos usado na comparação de perguntas.
+
+    Palavras compostas viram as partes quando as duas existem no banco
+    ("deepcopy" vira "deep" e "copy"), para casar com "deep copy".
+    """
+    conjunto = set()
+    for termo in termos(pergunta):
+        if len(termo) >= 6 and termo.isalpha():
+            for i in range(3, len(termo) - 2):
+                if termo[:i] in vocabulario and termo[i:] in vocabulario:
+                    conjunto.update((termo[:i], termo[i:]))
+                    break
+            else:
+                conjunto.add(termo)
+        else:
+            conjunto.add(termo)
+    return conjunto
+
+def semelhanca(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+def chaves_lsh(conjunto):
+    """Chaves das bandas LSH da assinatura MinHash de um conjunto de termos."""
+    valores = [int.from_bytes(hashlib.blake2b(termo.encode("utf-8"), digest_size=8).digest(), "little")
+               for termo in conjunto]
+    assinatura = array("Q", (min((a * v + b) % _PRIMO_MINHASH for v in valores)
+                             for a, b in _COEFICIENTES_MINHASH))
+    linhas = PERMUTACOES_MINHASH // BANDAS_LSH
+    return [
+        int.from_bytes(hashlib.blake2b(assinatura[i:i + linhas].tobytes(), digest_size=7).digest(), "little")
+        for i in range(0, PERMUTACOES_MINHASH, linhas)
+    ]
+
+class VocabularioBanco:
+    """Consulta termos_questoes sob demanda, para a indexação incremental."""
+
+    def __init__(self, db):
+        self.db = db
+        self._cache = {}
+
+    def __contains__(self, termo):
+        presente = self._cache.get(termo)
+        if presente is None:
+            presente = self._cache[termo] = self.db.execute(
+                "SELECT 1 FROM termos_questoes WHERE termo=?", (termo,)
+            ).fetchone() is not None
+        return presente
+
+def _unir_grupos(db, ids):
+    """Junta os ids (e os grupos a que já pertencem) num único grupo, identificado pelo menor id."""
+    marcadores = ",".join("?" * len(ids))
+    grupos = [g for g, in db.execute(f"SELECT DISTINCT grupo FROM grupos_questoes WHERE questao_id IN ({marcadores})", ids)]
+    membros = set(ids)
+    if grupos:
+        marcadores = ",".join("?" * len(grupos))
+        membros.update(i for i, in db.execute(f"SELECT questao_id FROM grupos_questoes WHERE grupo IN ({marcadores})", grupos))
+    grupo = min(membros)
+    db.executemany("""
+        INSERT INTO grupos_questoes (questao_id, grupo) VALUES (?, ?)
+        ON CONFLICT(questao_id) DO UPDATE SET grupo=excluded.grupo
+    """, [(i, grupo) for i in membros])
+
+def _conjuntos_gravados(db, ids):
+    """Conjuntos de termos gravados em caracteristicas_questoes: {id: set}."""
+    conjuntos = {}
+    for lote in em_lotes(ids, 900):
+        marcadores = ",".join("?" * len(lote))
+        for id_questao, texto in db.execute(
+                f"SELECT questao_id, termos FROM caracteristicas_questoes WHERE questao_id IN ({marcadores})", lote):
+            conjuntos[id_questao] = set(texto.split())
+    return conjuntos
+
+def indexar_duplicatas(db, questoes):
+    """Indexa questões recém-gravadas, [(id, pergunta)], e as junta aos grupos
+    de quase duplicatas existentes. Devolve quantas entraram em algum grupo.
+
+    Cada questão custa BANDAS_LSH consultas por chave no índice, sem
+    comparação com o banco inteiro; as candidatas são comparadas pelos
+    termos já gravados. Para cargas grandes, detectar_duplicatas() é mais barato.
+    """
+    db.executemany("INSERT OR IGNORE INTO termos_questoes (termo) VALUES (?)",
+                   [(t,) for t in {t for _, pergunta in questoes for t in termos(pergunta)}])
+    vocabulario = VocabularioBanco(db)
+    agrupadas = 0
+    for id_questao, pergunta in questoes:
+        conjunto = caracteristicas(pergunta, vocabulario)
+        if not conjunto:
+            continue
+        db.execute("INSERT OR REPLACE INTO caracteristicas_questoes (questao_id, termos) VALUES (?, ?)",
+                   (id_questao, " ".join(sorted(conjunto))))
+        chaves = list(enumerate(chaves_lsh(conjunto)))
+        candidatas = set()
+        for banda, chave in chaves:
+            balde = db.execute("SELECT questao_id FROM lsh_questoes WHERE banda=? AND chave=? LIMIT ?",
+                               (banda, chave, MAX_BALDE_LSH + 1)).fetchall()
+            if len(balde) <= MAX_BALDE_LSH:
+                candidatas.update(i for i, in balde)
+        db.executemany("INSERT OR IGNORE INTO lsh_questoes (banda, chave, questao_id) VALUES (?, ?, ?)",
+                       [(banda, chave, id_questao) for banda, chave in chaves])
+        candidatas.discard(id_questao)
+        if not candidatas:
+            continue
+        # Questões removidas não têm mais termos gravados e ficam de fora
+        iguais = [
+            outra for outra, termos_outra in _conjuntos_gravados(db, list(candidatas)).items()
+            if semelhanca(conjunto, termos_outra) >= LIMIAR_DUPLICATA
+        ]
+        if iguais:
+            _unir_grupos(db, [id_questao] + iguais)
+            agrupadas += 1
+    if agrupadas:
+        # Outros processos recarregam o banco de questões com os novos grupos
+        db.execute("UPDATE versoes SET versao = versao + 1 WHERE tabela = 'questoes'")
+    return agrupadas
+
+def _detectar_duplicatas_em(db):
+    """Refaz do zero o vocabulário, o índice LSH e os grupos de quase duplicatas."""
+    vocabulario = set()
+    for pergunta, in db.execute("SELECT pergunta FROM questoes"):
+        vocabulario.update(termos(pergunta))
+    db.execute("DELETE FROM termos_questoes")
+    db.executemany("INSERT INTO termos_questoes (termo) VALUES (?)", [(t,) for t in vocabulario])
+
+    db.execute("DELETE FROM lsh_questoes")
+    db.execute("DELETE FROM caracteristicas_questoes")
+    # As escritas vão para outras tabelas, então a leitura segue pelo cursor
+    for lote in em_lotes(db.execute("SELECT id, pergunta FROM questoes"), TAMANHO_LOTE_IMPORTACAO):
+        linhas = []
+        gravados = []
+        for id_questao, pergunta in lote:
+            conjunto = caracteristicas(pergunta, vocabulario)
+            if conjunto:
+                gravados.append((id_questao, " ".join(sorted(conjunto))))
+                linhas.extend((banda, chave, id_questao) for banda, chave in enumerate(chaves_lsh(conjunto)))
+        db.executemany("INSERT INTO caracteristicas_questoes (questao_id, termos) VALUES (?, ?)", gravados)
+        db.executemany("INSERT OR IGNORE INTO lsh_questoes (banda, chave, questao_id) VALUES (?, ?, ?)", linhas)
+
+    # Só os pares que caem juntos em algum balde são comparados
+    pai = {}
+
+    def raiz(x):
+        while pai.get(x, x) != x:
+            pai[x] = pai.get(pai[x], pai[x])
+            x = pai[x]
+        return x
+
+    conjuntos = {}
+    baldes = db.execute("""
+        SELECT group_concat(questao_id) FROM lsh_questoes
+        GROUP BY banda, chave HAVING COUNT(*) > 1
+    """).fetchall()
+    for membros, in baldes:
+        ids = [int(i) for i in membros.split(",")]
+        if len(ids) > MAX_BALDE_LSH:
+            continue
+        faltam = [i for i in ids if i not in conjuntos]
+        if faltam:
+            conjuntos.update(_conjuntos_gravados(db, faltam))
+        for posicao, a in enumerate(ids):
+            for b in ids[posicao + 1:]:
+                raiz_a, raiz_b = raiz(a), raiz(b)
+                if raiz_a != raiz_b and semelhanca(conjuntos[a], conjuntos[b]) >= LIMIAR_DUPLICATA:
+                    pai[max(raiz_a, raiz_b)] = min(raiz_a, raiz_b)
+
+    db.execute("DELETE FROM grupos_questoes")
+    db.executemany("INSERT INTO grupos_questoes (questao_id, grupo) VALUES (?, ?)",
+                   [(i, raiz(i)) for i in list(pai) if raiz(i) != i] + [(r, r) for r in {raiz(i) for i in list(pai)}])
+    # Versão zero significa banco ainda não semeado: não pode mudar aqui
+    db.execute("UPDATE versoes SET versao = versao + 1 WHERE tabela = 'questoes' AND versao > 0")
+    return len({raiz(i) for i in pai})
+
+def detectar_duplicatas():
+    """Detecção em lote sobre a tabela inteira; devolve o número de grupos."""
+    with conectar() as db:
+        return _detectar_duplicatas_em(db)
+
+def grupos_duplicatas():
+    """Grupos de quase duplicatas: lista de listas de (id, pergunta, nivel)."""
+    with conectar() as db:
+        _banco_questoes.atualizar(db)  # semeia um banco novo
+        linhas = db.execute("""
+            SELECT g.grupo, q.id, q.pergunta, q.nivel
+            FROM grupos_questoes g JOIN questoes q ON q.id = g.questao_id
+            ORDER BY g.grupo, q.id
+        """).fetchall()
+    grupos = {}
+    for grupo, id_questao, pergunta, nivel in linhas:
+        grupos.setdefault(grupo, []).append((id_questao, pergunta, nivel))
+    return [membros for membros in grupos.values() if len(membros) > 1]
+
+def ver_duplicatas():
+    grupos = grupos_duplicatas()
+    if not grupos:
+        print("✓ Nenhuma questão quase duplicada encontrada.")
+        return
+    print("\n" + "="*50)
+    print(f"GRUPOS DE QUASE DUPLICATAS ({len(grupos)})")
+    print("="*50)
+    for membros in grupos:
+        print(f"Grupo #{membros[0][0]} ({len(membros)} questões):")
+        for id_questao, pergunta, nivel in membros:
+            print(f"   #{id_questao} [{nivel}] {pergunta}")
+    print("="*50)
+
+class BuscaIndisponivel(RuntimeError):
+    """O SQLite não tem FTS5, então o índice questoes_fts não foi criado."""
+
+def buscar_questoes(texto, limite=20):
+    """Busca textual (FTS5) na pergunta e nas alternativas; a pergunta pesa mais.
+
+    Todos os termos precisam aparecer; um termo terminado em * busca por prefixo.
+    Levanta BuscaIndisponivel se o banco foi migrado sem FTS5.
+    """
+    consulta = " ".join(
+        '"' + termo.rstrip("*").replace('"', '""') + '"' + ("*" if termo.endswith("*") else "")
+        for termo in texto.split() if termo.rstrip("*")
+    )
+    if not consulta:
+        return []
+    with conectar() as db:
+        if db.execute("SELECT 1 FROM sqlite_master WHERE name = 'questoes_fts'").fetchone() is None:
+            raise BuscaIndisponivel("busca indisponível: o SQLite deste ambiente não tem FTS5")
+        _banco_questoes.atualizar(db)  # semeia um banco novo
+        linhas = db.execute("""
+            SELECT q.id, q.pergunta, q.nivel,
+                   snippet(questoes_fts, -1, '[', ']', '…', 10)
+            FROM questoes_fts JOIN questoes q ON q.id = questoes_fts.rowid
+            WHERE questoes_fts MATCH ?
+            ORDER BY bm25(questoes_fts, 3.0, 1.0, 1.0, 1.0, 1.0)
+            LIMIT ?
+        """, (consulta, limite)).fetchall()
+    return [{"id": i, "pergunta": p, "nivel": n, "trecho": t} for i, p, n, t in linhas]
+
+# -----------------------------------
+# QUESTÕES INÉDITAS (MAPA DE QUESTÕES VISTAS)
+# -----------------------------------
+MAX_BYTES_VISTAS = 64 * 1024 * 1024  # memória total dos mapas em cache (LRU)
+TENTATIVAS_POR_QUESTAO = 4  # sorteios rejeitados tolerados antes de varrer o nível
+
+class MapaVistas:
+    """Bitset das questões que um usuário já recebeu, indexado pelo id.
+
+    Ocupa um bit por id (125 KB para um milhão de questões) e é gravado
+    como BLOB na tabela questoes_vistas.
+    """
+
+    __slots__ = ("bits", "lock", "alterado")
+
+    def __init__(self, bits=b""):
+        self.bits = bytearray(bits)
+        self.lock = threading.Lock()
+        self.alterado = False  # há marcações ainda não gravadas
+
+    def visto(self, id_questao):
+        byte = id_questao >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (id_questao & 7)))
+
+    def marcar(self, ids):
+        for id_questao in ids:
+            byte = id_questao >> 3
+            if byte >= len(self.bits):
+                self.bits.extend(bytes(byte + 1 - len(self.bits)))
+            self.bits[byte] |= 1 << (id_questao & 7)
+
+    def desmarcar(self, ids):
+        tamanho = len(self.bits)
+        for id_questao in ids:
+            byte = id_questao >> 3
+            if byte < tamanho:
+                self.bits[byte] &= ~(1 << (id_questao & 7)) & 0xFF
+
+    def sortear(self, populacao, k, candidatos=(), aceitar=None):
+        """Sorteia até k ids de `populacao` dando preferência aos não vistos.
+
+        `candidatos` (um quiz pré-gerado, por exemplo) são testados antes dos
+        sorteios novos, e `aceitar(id)` pode recusar ids (duplicatas). Com
+        muitas inéditas, o sorteio por rejeição custa O(k) em média. Quando
+        as rejeições passam do limite, varre o nível atrás das restantes; se
+        não bastam, o nível recomeça um novo ciclo (os bits dele são zerados)
+        e o quiz é completado com questões do ciclo anterior, que são as
+        vistas há mais tempo.
+        """
+        k = min(k, len(populacao))
+        escolhidas = []
+        if k == 0:
+            return escolhidas
+        with self.lock:
+            testadas = set()
+
+            def escolher(ids, filtrar=True):
+                for id_questao in ids:
+                    if len(escolhidas) == k:
+                        return
+                    if id_questao in testadas or self.visto(id_questao):
+                        continue
+                    testadas.add(id_questao)
+                    if not filtrar or aceitar is None or aceitar(id_questao):
+                        escolhidas.append(id_questao)
+
+            novos = (populacao[random.randrange(len(populacao))] for _ in range(TENTATIVAS_POR_QUESTAO * k))
+            escolher(itertools.chain(candidatos, novos))
+            if len(escolhidas) < k:
+                ineditas = [i for i in populacao if i not in testadas and not self.visto(i)]
+                random.shuffle(ineditas)
+                escolher(ineditas)
+            if len(escolhidas) < k:
+                self.desmarcar(populacao)
+                restantes = [i for i in populacao if i not in testadas]
+                random.shuffle(restantes)
+                escolher(restantes)
+            if len(escolhidas) < k:
+                # Sobraram só questões de grupos já usados: completa sem o filtro
+                testadas.difference_update(populacao)
+                testadas.update(escolhidas)
+                escolher(random.sample(populacao, len(populacao)), filtrar=False)
+            self.marcar(escolhidas)
+            self.alterado = True
+        return escolhidas
+
+class QuestoesVistas:
+    """Mapas de questões vistas por usuário, em LRU na memória.
+
+    Sortear um quiz só altera o mapa em memória. A gravação fica fora do
+    caminho da requisição: acontece junto com o lote de resultados do
+    usuário (como ouvinte da fila), quando o mapa é despejado do LRU e na
+    saída do programa.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES_VISTAS):
+        # O limite é de bytes, não de usuários: cada mapa tem o tamanho do
+        # maior id que contém (125 KB com um milhão de questões)
+        self.max_bytes = max_bytes
+        self._mapas = OrderedDict()
+        self._tamanhos = {}  # usuario_id -> bytes contabilizados do mapa
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _contabilizar(self, usuario_id, mapa):
+        # Chamado com o lock; o mapa cresce quando recebe ids maiores
+        tamanho = len(mapa.bits)
+        self._bytes += tamanho - self._tamanhos.get(usuario_id, 0)
+        self._tamanhos[usuario_id] = tamanho
+
+    def _despejar(self):
+        # Chamado com o lock; o mapa mais recente sempre fica
+        despejados = []
+        while self._bytes > self.max_bytes and len(self._mapas) > 1:
+            usuario_id, mapa = self._mapas.popitem(last=False)
+            self._bytes -= self._tamanhos.pop(usuario_id)
+            despejados.append((usuario_id, mapa))
+        return despejados
+
+    def ajustar(self, usuario_id):
+        """Recontabiliza o mapa após marcações (que podem aumentá-lo) e despeja o excesso."""
+        with self._lock:
+            mapa = self._mapas.get(usuario_id)
+            if mapa is None:
+                return
+            self._contabilizar(usuario_id, mapa)
+            despejados = self._despejar()
+        self._gravar_varios(despejados)
+
+    @property
+    def bytes_em_cache(self):
+        return self._bytes
+
+    def obter(self, usuario_id):
+        despejados = []
+        with self._lock:
+            mapa = self._mapas.get(usuario_id)
+            if mapa is not None:
+                self._mapas.move_to_end(usuario_id)
+                self._contabilizar(usuario_id, mapa)
+                despejados = self._despejar()
+        if mapa is not None:
+            self._gravar_varios(despejados)
+            return mapa
+
+        with conectar() as db:
+            linha = db.execute("SELECT mapa FROM questoes_vistas WHERE usuario_id=?", (usuario_id,)).fetchone()
+        mapa = MapaVistas(linha[0] if linha else b"")
+
+        with self._lock:
+            mapa = self._mapas.setdefault(usuario_id, mapa)
+            self._mapas.move_to_end(usuario_id)
+            self._contabilizar(usuario_id, mapa)
+            despejados = self._despejar()
+        self._gravar_varios(despejados)
+        return mapa
+
+    def _gravar_varios(self, mapas):
+        """Grava os mapas alterados de [(usuario_id, mapa)] numa transação."""
+        linhas = []
+        alterados = []
+        for usuario_id, mapa in mapas:
+            with mapa.lock:
+                if mapa.alterado:
+                    mapa.alterado = False
+                    alterados.append(mapa)
+                    linhas.append((usuario_id, bytes(mapa.bits)))
+        if not linhas:
+            return
+        try:
+            with conectar() as db:
+                db.executemany("""
+                    INSERT INTO questoes_vistas (usuario_id, mapa) VALUES (?, ?)
+                    ON CONFLICT(usuario_id) DO UPDATE SET mapa=excluded.mapa, atualizado_em=CURRENT_TIMESTAMP
+                """, linhas)
+        except Exception:
+            # Continuam pendentes para a próxima oportunidade
+            for mapa in alterados:
+                mapa.alterado = True
+            raise
+
+    def gravar_usuarios(self, usuario_ids):
+        with self._lock:
+            mapas = [(u, self._mapas[u]) for u in usuario_ids if u in self._mapas]
+        self._gravar_varios(mapas)
+
+    def registrar(self, resultados):
+        """Ouvinte da fila de resultados: grava os mapas dos usuários do lote."""
+        self.gravar_usuarios({r.usuario_id for r in resultados})
+
+    def gravar_todos(self):
+        with self._lock:
+            mapas = list(self._mapas.items())
+        self._gravar_varios(mapas)
+
+    def esquecer(self, usuario_id):
+        with self._lock:
+            self._mapas.pop(usuario_id, None)
+            self._bytes -= self._tamanhos.pop(usuario_id, 0)
+        with conectar() as db:
+            db.execute("DELETE FROM questoes_vistas WHERE usuario_id=?", (usuario_id,))
+
+questoes_vistas = QuestoesVistas()
+atexit.register(questoes_vistas.gravar_todos)
+
+# -----------------------------------
+# SENHAS (HASH E VERIFICAÇÃO)
+# -----------------------------------
+CUSTO_SENHA = 2 ** 14     # parâmetro N do scrypt; dobrar o valor dobra o tempo
+BLOCOS_SENHA = 8          # parâmetro r do scrypt
+THREADS_SENHAS = 2
+VALIDADE_CACHE_SENHAS = 300  # segundos
+MAX_CACHE_SENHAS = 10000
+
+class Senhas:
+    """Hash scrypt de senhas calculado num pool de threads próprio.
+
+    O scrypt é lento de propósito; rodando fora da thread que atende o
+    usuário (o hashlib libera o GIL durante o cálculo), um login não
+    segura os demais. Verificações bem-sucedidas ficam num cache curto
+    para que logins repetidos não paguem o custo de novo.
+    """
+
+    PREFIXO = "scrypt"
+
+    def __init__(self, custo=CUSTO_SENHA, blocos=BLOCOS_SENHA, threads=THREADS_SENHAS):
+        self.custo = custo
+        self.blocos = blocos
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="senhas")
+        self._chave_cache = secrets.token_bytes(32)
+        self._cache = OrderedDict()  # digest -> (hash armazenado, validade)
+        self._lock = threading.Lock()
+        self._hash_ficticio = None
+
+    def _derivar(self, senha, sal, custo, blocos):
+        return hashlib.scrypt(senha.encode("utf-8"), salt=sal, n=custo, r=blocos, p=1,
+                              maxmem=256 * custo * blocos)
+
+    def _gerar(self, senha):
+        sal = secrets.token_bytes(16)
+        chave = self._derivar(senha, sal, self.custo, self.blocos)
+        return f"{self.PREFIXO}${self.custo}${self.blocos}${sal.hex()}${chave.hex()}"
+
+    def _verificar(self, senha, armazenado):
+        """Devolve (confere, precisa_novo_hash)."""
+        partes = armazenado.split("$")
+        if partes[0] != self.PREFIXO or len(partes) != 5:
+            # Senha antiga em texto puro: confere direto e pede migração
+            return hmac.compare_digest(senha.encode("utf-8"), armazenado.encode("utf-8")), True
+        _, custo, blocos, sal, esperado = partes
+        custo, blocos = int(custo), int(blocos)
+        chave = self._derivar(senha, bytes.fromhex(sal), custo, blocos)
+        confere = hmac.compare_digest(chave.hex(), esperado)
+        return confere, confere and (custo, blocos) != (self.custo, self.blocos)
+
+    def gerar(self, senha):
+        return self.executor.submit(self._gerar, senha)
+
+    def verificar(self, senha, armazenado):
+        return self.executor.submit(self._verificar, senha, armazenado)
+
+    def verificar_ficticio(self, senha):
+        # Usuário inexistente leva o mesmo tempo que uma senha errada
+        return self.executor.submit(self._verificar_ficticio, senha)
+
+    def _verificar_ficticio(self, senha):
+        # Roda no pool: o hash fictício também é calculado fora de quem chamou
+        if self._hash_ficticio is None:
+            self._hash_ficticio = self._gerar(secrets.token_hex(8))
+        return self._verificar(senha, self._hash_ficticio)
 
-    cursor.execute("SELECT COUNT(*) FROM questoes")
-    qtd = cursor.fetchone()[0]
+    def _digest(self, usuario_id, senha):
+        mensagem = f"{usuario_id}\x00{senha}".encode("utf-8")
+        return hmac.new(self._chave_cache, mensagem, hashlib.sha256).digest()
 
-    if qtd > 0:
-        db.close()
-        return
+    def em_cache(self, usuario_id, senha, armazenado):
+        digest = self._digest(usuario_id, senha)
+        with self._lock:
+            entrada = self._cache.get(digest)
+            if entrada is None:
+                return False
+            if entrada[0] != armazenado or entrada[1] < time.monotonic():
+                del self._cache[digest]
+                return False
+            self._cache.move_to_end(digest)
+            return True
 
-    questoes = [
-        # BÁSICO (40 questões)
-        ("Qual comando imprime algo na tela em Python?", "echo()", "print()", "mostrar()", "display()", "B", "basico"),
-        ("Qual operador cria comentários em Python?", "//", "<!-- -->", "#", "/**/", "C", "basico"),
-        ("Qual tipo representa números inteiros?", "int", "float", "real", "decimal", "A", "basico"),
-        ("Como criar uma variável em Python?", "var x = 10", "x = 10", "int x = 10", "declare x = 10", "B", "basico"),
-        ("Qual o resultado de: 10 // 3?", "3.33", "3", "4", "3.0", "B", "basico"),
-        ("Como criar uma string em Python?", "string = 'texto'", "Todas as alternativas", "string = \"texto\"", "string = '''texto'''", "B", "basico"),
-        ("Qual palavra-chave define uma função?", "function", "def", "func", "define", "B", "basico"),
-        ("Como criar uma lista vazia?", "lista = []", "lista = ()", "lista = {}", "lista = list", "A", "basico"),
-        ("Qual método adiciona um item ao final de uma lista?", "add()", "append()", "insert()", "push()", "B", "basico"),
-        ("Como verificar o tipo de uma variável?", "typeof()", "type()", "checktype()", "vartype()", "B", "basico"),
-        ("Qual operador verifica igualdade?", "=", "==", "===", "equals", "B", "basico"),
-        ("Como criar um loop for que itera de 0 a 4?", "for i in range(5)", "for i in 0..4", "for i = 0 to 4", "for i in [0,4]", "A", "basico"),
-        ("Qual palavra-chave inicia uma condição?", "if", "when", "condition", "check", "A", "basico"),
-        ("Como converter string para inteiro?", "int()", "toInt()", "parseInt()", "str2int()", "A", "basico"),
-        ("Qual o resultado de: len([1,2,3])?", "2", "3", "4", "Erro", "B", "basico"),
-        ("Como criar um dicionário vazio?", "dict = []", "dict = ()", "dict = {}", "dict = dict()", "C", "basico"),
-        ("Qual palavra-chave é usada para importar módulos?", "include", "import", "require", "using", "B", "basico"),
-        ("Como escrever um loop infinito?", "while True:", "loop forever:", "while 1:", "A e C estão corretas", "D", "basico"),
-        ("Qual método remove o último item de uma lista?", "remove()", "delete()", "pop()", "drop()", "C", "basico"),
-        ("Como verificar se uma chave existe em um dicionário?", "key in dict", "dict.has(key)", "dict.contains(key)", "key.exists(dict)", "A", "basico"),
-        ("Qual o resultado de: 'python'[0]?", "python", "p", "y", "Erro", "B", "basico"),
-        ("Como concatenar strings?", "'a' + 'b'", "'a'.concat('b')", "concat('a','b')", "join('a','b')", "A", "basico"),
-        ("Qual palavra-chave interrompe um loop?", "stop", "break", "exit", "end", "B", "basico"),
-        ("Como criar uma tupla?", "tupla = []", "tupla = ()", "tupla = {}", "tupla = tuple", "B", "basico"),
-        ("Qual o resultado de: bool(0)?", "True", "False", "0", "Erro", "B", "basico"),
-        ("Como pegar entrada do usuário?", "input()", "get()", "read()", "scan()", "A", "basico"),
-        ("Qual operador para 'e' lógico?", "&&", "and", "&", "AND", "B", "basico"),
-        ("Como arredondar um número?", "round()", "ceil()", "floor()", "int()", "A", "basico"),
-        ("Qual o resultado de: 'ABC'.lower()?", "ABC", "abc", "Abc", "aBc", "B", "basico"),
-        ("Como dividir uma string?", "split()", "divide()", "separate()", "break()", "A", "basico"),
-        ("Qual palavra-chave pula para próxima iteração?", "skip", "next", "continue", "pass", "C", "basico"),
-        ("Como criar um set vazio?", "set = {}", "set = set()", "set = []", "set = ()", "B", "basico"),
-        ("Qual o resultado de: 2 ** 3?", "5", "6", "8", "9", "C", "basico"),
-        ("Como verificar o tamanho de uma string?", "len()", "size()", "length()", "count()", "A", "basico"),
-        ("Qual palavra-chave define uma classe?", "class", "struct", "object", "type", "A", "basico"),
-        ("Como criar uma lista de 0 a 9?", "list(range(10))", "[0:9]", "list(0,9)", "range[10]", "A", "basico"),
-        ("Qual o resultado de: 10 % 3?", "3", "1", "0", "10", "B", "basico"),
-        ("Como verificar se lista está vazia?", "if not lista:", "if lista == []:", "if len(lista) == 0:", "Todas as alternativas", "D", "basico"),
-        ("Qual método transforma lista em string?", "join()", "concat()", "merge()", "toString()", "A", "basico"),
-        ("Como copiar uma lista?", "lista.copy()", "lista[:]", "list(lista)", "Todas as alternativas", "D", "basico"),
-        
-        # INTERMEDIÁRIO (40 questões)
-        ("O que é list comprehension?", "Uma função", "Uma forma concisa de criar listas", "Um tipo de loop", "Um método de lista", "B", "intermediario"),
-        ("Qual a diferença entre append() e extend()?", "Nenhuma", "append adiciona 1 item, extend adiciona múltiplos", "extend é mais rápido", "append não existe", "B", "intermediario"),
-        ("O que são args e kwargs?", "Tipos de dados", "Argumentos variáveis", "Métodos especiais", "Palavras reservadas", "B", "intermediario"),
-        ("O que é uma função lambda?", "Função sem nome", "Função recursiva", "Função assíncrona", "Função de classe", "A", "intermediario"),
-        ("Qual a diferença entre deepcopy e copy?", "Nenhuma", "deepcopy copia objetos aninhados", "copy é mais rápido", "deepcopy não existe", "B", "intermediario"),
-        ("O que é um decorator?", "Uma função que modifica outra função", "Um tipo de classe", "Um loop especial", "Um comentário", "A", "intermediario"),
-        ("Como tratar exceções em Python?", "try/except", "try/catch", "handle/error", "check/error", "A", "intermediario"),
-        ("O que é um generator?", "Um tipo de lista", "Função que retorna iterador", "Um loop infinito", "Uma classe especial", "B", "intermediario"),
-        ("Qual a diferença entre is e ==?", "Nenhuma", "is compara identidade, == compara valor", "== é mais rápido", "is verifica tipo", "B", "intermediario"),
-        ("O que faz o método __init__?", "Inicia o programa", "Construtor da classe", "Deleta objeto", "Importa módulos", "B", "intermediario"),
-        ("Como criar um iterador customizado?", "Implementar __iter__ e __next__", "Usar função iter()", "Herdar de Iterator", "Usar @iterator", "A", "intermediario"),
-        ("O que é slicing?", "Cortar strings", "Fatiar sequências", "Dividir números", "Todas as alternativas", "B", "intermediario"),
-        ("Qual a diferença entre list e tuple?", "list é mutável, tuple não", "tuple é mais rápido", "list usa menos memória", "A e B estão corretas", "D", "intermediario"),
-        ("O que é uma closure?", "Função dentro de função", "Função que acessa variáveis externas", "Função sem return", "Função recursiva", "B", "intermediario"),
-        ("Como funciona o with statement?", "Cria contexto e gerencia recursos", "Define variável", "Cria loop", "Importa módulo", "A", "intermediario"),
-        ("O que são métodos estáticos?", "Métodos da classe, não da instância", "Métodos finais", "Métodos privados", "Métodos sem parâmetros", "A", "intermediario"),
-        ("Qual a diferença entre sort() e sorted()?", "sort modifica lista, sorted cria nova", "Nenhuma", "sorted é mais rápido", "sort não existe", "A", "intermediario"),
-        ("O que é duck typing?", "Sistema de tipos do Python", "Verificação de tipo em runtime", "Tipagem estática", "Conversão de tipos", "B", "intermediario"),
-        ("Como criar propriedades em classes?", "Usar @property", "Usar get/set", "Usar variáveis privadas", "Usar __getattr__", "A", "intermediario"),
-        ("O que faz o método map()?", "Aplica função a cada item", "Cria dicionário", "Mapeia variáveis", "Itera sobre lista", "A", "intermediario"),
-        ("Qual a diferença entre __str__ e __repr__?", "__str__ para humanos, __repr__ para debug", "Nenhuma", "__repr__ é mais rápido", "__str__ não existe", "A", "intermediario"),
-        ("O que são context managers?", "Gerenciam recursos com with", "Gerenciam memória", "Gerenciam threads", "Gerenciam imports", "A", "intermediario"),
-        ("Como funciona a função zip()?", "Compacta arquivos", "Combina iteráveis", "Cria tuplas", "B e C estão corretas", "D", "intermediario"),
-        ("O que é um namespace?", "Espaço de nomes para variáveis", "Tipo de string", "Função especial", "Módulo do Python", "A", "intermediario"),
-        ("Qual a diferença entre método e função?", "Método pertence a classe", "Nenhuma", "Função é mais rápida", "Método não retorna valor", "A", "intermediario"),
-        ("O que faz filter()?", "Filtra elementos de iterável", "Remove duplicatas", "Ordena lista", "Valida dados", "A", "intermediario"),
-        ("Como criar método de classe?", "Usar @classmethod", "Usar @staticmethod", "Usar def classmethod", "Não é possível", "A", "intermediario"),
-        ("O que é unpacking?", "Desempacotar sequências", "Comprimir dados", "Remover elementos", "Copiar listas", "A", "intermediario"),
-        ("Qual a diferença entre shallow e deep copy?", "shallow copia referência, deep copia valor", "Nenhuma", "deep é mais rápido", "shallow não existe", "A", "intermediario"),
-        ("O que são magic methods?", "Métodos especiais com __", "Métodos secretos", "Métodos rápidos", "Métodos de debug", "A", "intermediario"),
-        ("Como criar um singleton em Python?", "Usar __new__", "Usar @singleton", "Usar global", "Não é possível", "A", "intermediario"),
-        ("O que faz enumerate()?", "Adiciona índice ao iterar", "Conta elementos", "Enumera tipos", "Lista variáveis", "A", "intermediario"),
-        ("Qual diferença entre shallow e deep equality?", "Compara referência vs valor recursivo", "Nenhuma", "deep é mais preciso", "shallow é mais rápido", "A", "intermediario"),
-        ("O que é método estático?", "Não recebe self nem cls", "Método final", "Método privado", "Método sem retorno", "A", "intermediario"),
-        ("Como funciona o operador *?", "Desempacota sequências", "Multiplica valores", "Cria ponteiro", "A e B estão corretas", "D", "intermediario"),
-        ("O que são assertions?", "Verificações de debug", "Exceções", "Testes unitários", "Comentários", "A", "intermediario"),
-        ("Qual a diferença entre get() e []?", "get retorna None se não existe", "Nenhuma", "[] é mais rápido", "get não existe", "A", "intermediario"),
-        ("O que é múltipla herança?", "Classe herda de várias classes", "Várias classes em arquivo", "Instâncias múltiplas", "Métodos duplicados", "A", "intermediario"),
-        ("Como criar variável privada?", "Usar _ ou __ no início", "Usar @private", "Usar private keyword", "Não é possível", "A", "intermediario"),
-        ("O que faz reduce()?", "Reduz iterável a um valor", "Remove elementos", "Diminui tamanho", "Simplifica código", "A", "intermediario"),
-        
-        # AVANÇADO (20 questões)
-        ("O que é o GIL?", "Global Interpreter Lock", "Gerenciador de imports", "Gerador de listas", "Garbage collector", "A", "avancado"),
-        ("Como funciona o garbage collector?", "Coleta objetos sem referências", "Remove arquivos temporários", "Limpa memória cache", "Otimiza código", "A", "avancado"),
-        ("O que são metaclasses?", "Classes que criam classes", "Classes abstratas", "Classes finais", "Classes de metadados", "A", "avancado"),
-        ("Como funciona asyncio?", "Programação assíncrona", "Sincronização de threads", "I/O paralelo", "Todas as alternativas", "A", "avancado"),
-        ("O que é descriptor protocol?", "Protocolo para controlar atributos", "Sistema de tipos", "Padrão de projeto", "Protocolo de rede", "A", "avancado"),
-        ("Qual a diferença entre thread e process?", "Threads compartilham memória", "Nenhuma", "Processes são mais rápidos", "Threads são mais seguras", "A", "avancado"),
-        ("O que é monkey patching?", "Modificar código em runtime", "Corrigir bugs", "Testar código", "Otimizar performance", "A", "avancado"),
-        ("Como funciona o método __getattr__?", "Chamado quando atributo não existe", "Retorna todos atributos", "Define atributo", "Remove atributo", "A", "avancado"),
-        ("O que é type hinting?", "Anotações de tipo", "Sistema de tipos dinâmico", "Conversão de tipos", "Verificação de tipos", "A", "avancado"),
-        ("Como criar um context manager customizado?", "Implementar __enter__ e __exit__", "Usar with statement", "Herdar de Context", "Usar @context", "A", "avancado"),
-        ("O que é o método __call__?", "Torna instância chamável", "Chama método", "Executa função", "Retorna callable", "A", "avancado"),
-        ("Qual a diferença entre new e init?", "__new__ cria instância, __init__ inicializa", "Nenhuma", "__init__ é mais usado", "__new__ não existe", "A", "avancado"),
-        ("O que são coroutines?", "Funções assíncronas", "Threads leves", "Processos paralelos", "Funções geradoras", "A", "avancado"),
-        ("Como funciona o import system?", "sys.modules, finders, loaders", "Importa módulos diretamente", "Usa cache global", "Compila código", "A", "avancado"),
-        ("O que é MRO?", "Method Resolution Order", "Multiple Return Object", "Memory Reference Order", "Module Resource Object", "A", "avancado"),
-        ("Como funciona weakref?", "Referências fracas que não impedem GC", "Referências fortes", "Referências circulares", "Referências globais", "A", "avancado"),
-        ("O que são abstract base classes?", "Classes base que não podem ser instanciadas", "Classes abstratas", "Classes de interface", "Todas as alternativas", "D", "avancado"),
-        ("Como funciona __slots__?", "Limita atributos e economiza memória", "Define métodos", "Cria propriedades", "Inicializa classe", "A", "avancado"),
-        ("O que é memoryview?", "Visualiza buffer de memória sem cópia", "Monitora uso de memória", "Cache de objetos", "Profiler de memória", "A", "avancado"),
-        ("Como implementar iterator protocol?", "Definir __iter__ e __next__", "Usar yield", "Herdar de Iterator", "Usar @iterator", "A", "avancado"),
-    ]
+    def lembrar(self, usuario_id, senha, armazenado):
+        digest = self._digest(usuario_id, senha)
+        with self._lock:
+            self._cache[digest] = (armazenado, time.monotonic() + VALIDADE_CACHE_SENHAS)
+            self._cache.move_to_end(digest)
+            while len(self._cache) > MAX_CACHE_SENHAS:
+                self._cache.popitem(last=False)
 
-    sql = """
-        INSERT INTO questoes (pergunta, alternativaA, alternativaB, alternativaC, alternativaD, correta, nivel)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """
+gerenciador_senhas = Senhas()
+
+def buscar_credencial(usuario):
+    with conectar() as db:
+        cursor = db.cursor()
+        cursor.execute("SELECT id, senha FROM usuarios WHERE usuario=?", (usuario,))
+        return cursor.fetchone()
+
+def atualizar_hash_senha(usuario_id, antigo, novo):
+    # Só troca se ninguém alterou a senha nesse meio tempo
+    with conectar() as db:
+        db.execute("UPDATE usuarios SET senha=? WHERE id=? AND senha=?", (novo, usuario_id, antigo))
 
-    cursor.executemany(sql, questoes)
-    db.commit()
-    db.close()
-    print("✓ 100 questões inseridas com sucesso!")
+def inserir_usuario(usuario, senha_hash):
+    try:
+        with conectar() as db:
+            cursor = db.cursor()
+            cursor.execute("INSERT INTO usuarios (usuario, senha) VALUES (?, ?)", (usuario, senha_hash))
+            return cursor.lastrowid
+    except sqlite3.IntegrityError:
+        return None
 
 # -----------------------------------
 # CADASTRO DE NOVO USUÁRIO
 # -----------------------------------
-def cadastrar_usuario():
-    db = conectar()
-    cursor = db.cursor()
+def registrar_usuario(usuario, senha):
+    """Cria o usuário e devolve seu id, ou None se o nome já estiver em uso."""
+    if not usuario or not senha:
+        raise ValueError("usuário e senha não podem ser vazios")
+    return inserir_usuario(usuario, gerenciador_senhas.gerar(senha).result())
 
+def cadastrar_usuario():
     print("\n---- CADASTRO ----")
     
     while True:
@@ -211,22 +1698,41 @@ def cadastrar_usuario():
             print("As senhas não coincidem! Tente novamente.\n")
             continue
         
-        try:
-            cursor.execute("INSERT INTO usuarios (usuario, senha) VALUES (?, ?)", (usuario, senha))
-            db.commit()
+        if registrar_usuario(usuario, senha) is not None:
             print("\n✓ Cadastro realizado com sucesso!\n")
-            db.close()
             return True
-        except sqlite3.IntegrityError:
-            print("Usuário já existe! Escolha outro nome.\n")
+        print("Usuário já existe! Escolha outro nome.\n")
 
 # -----------------------------------
 # LOGIN
 # -----------------------------------
-def login():
-    db = conectar()
-    cursor = db.cursor()
+@instrumentado("login")
+def autenticar(usuario, senha):
+    """Devolve o id do usuário se as credenciais conferem, senão None.
+
+    Senhas ainda em texto puro (ou com custo antigo) recebem um hash novo
+    no primeiro login bem-sucedido.
+    """
+    credencial = buscar_credencial(usuario)
+    if credencial is None:
+        gerenciador_senhas.verificar_ficticio(senha).result()
+        return None
+
+    usuario_id, armazenado = credencial
+    if gerenciador_senhas.em_cache(usuario_id, senha, armazenado):
+        return usuario_id
+
+    confere, novo_hash = gerenciador_senhas.verificar(senha, armazenado).result()
+    if not confere:
+        return None
+    if novo_hash:
+        novo = gerenciador_senhas.gerar(senha).result()
+        atualizar_hash_senha(usuario_id, armazenado, novo)
+        armazenado = novo
+    gerenciador_senhas.lembrar(usuario_id, senha, armazenado)
+    return usuario_id
 
+def login():
     print("\n---- LOGIN ----")
 
     tentativas = 0
@@ -236,13 +1742,11 @@ def login():
         user = input("Usuário: ").strip()
         senha = input("Senha: ").strip()
 
-        cursor.execute("SELECT id FROM usuarios WHERE usuario=? AND senha=?", (user, senha))
-        resultado = cursor.fetchone()
+        resultado = autenticar(user, senha)
 
         if resultado:
             print("\n✓ Login realizado com sucesso!\n")
-            db.close()
-            return resultado[0]
+            return resultado
         else:
             tentativas += 1
             restantes = max_tentativas - tentativas
@@ -250,126 +1754,1286 @@ def login():
                 print(f"✗ Usuário ou senha inválidos. Tentativas restantes: {restantes}\n")
             else:
                 print("✗ Número máximo de tentativas excedido.")
-                db.close()
                 return None
 
+# -----------------------------------
+# QUIZZES PRÉ-GERADOS
+# -----------------------------------
+QUESTOES_POR_QUIZ = 10
+TAMANHO_POOL_QUIZZES = 32  # quizzes prontos por nível (e para o misto)
+
+class PoolQuizzes:
+    """Filas limitadas de quizzes prontos, uma por nível e uma para o misto.
+
+    `retirar` só faz um popleft; uma thread em segundo plano repõe as filas
+    a partir do QuestionBank. Cada quiz guarda a versão do banco em que foi
+    sorteado e a troca de versão descarta as filas inteiras.
+    """
+
+    def __init__(self, tamanho=TAMANHO_POOL_QUIZZES, niveis=(None,) + NIVEIS):
+        self.tamanho = tamanho
+        self._filas = {nivel: deque() for nivel in niveis}
+        self._versao = None
+        self._lock = threading.Lock()
+        self._repor = threading.Event()
+        self._pid = None
+        self.entregues = 0
+        self.faltas = 0
+        self.gerados = 0
+        self.descartados = 0
+        self.erros = 0
+
+    def _iniciar(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._executar, name="pool-quizzes", daemon=True).start()
+
+    def retirar(self, nivel, versao):
+        """Devolve um quiz pronto da versão `versao` ou None (falta)."""
+        if self._pid != os.getpid():
+            self._iniciar()
+        if versao != self._versao:
+            self._invalidar(versao)
+        fila = self._filas.get(nivel)
+        try:
+            quiz_versao, quiz = fila.popleft()
+        except (IndexError, AttributeError):
+            quiz = None
+        else:
+            if quiz_versao != versao:
+                quiz = None
+        if quiz is None:
+            self.faltas += 1
+        else:
+            self.entregues += 1
+        self._repor.set()
+        return quiz
+
+    def _invalidar(self, versao):
+        with self._lock:
+            if versao == self._versao:
+                return
+            for fila in self._filas.values():
+                self.descartados += len(fila)
+                fila.clear()
+            self._versao = versao
+
+    def _executar(self):
+        while True:
+            self._repor.wait()
+            self._repor.clear()
+            versao = self._versao
+            if versao is None or versao != _banco_questoes.versao:
+                continue
+            for nivel, fila in self._filas.items():
+                # Um erro não pode derrubar a thread: o nível fica para a
+                # próxima reposição, pedida a cada retirar
+                try:
+                    while len(fila) < self.tamanho and versao == self._versao:
+                        quiz = _banco_questoes.sem_duplicatas(_banco_questoes.sortear(nivel, QUESTOES_POR_QUIZ), nivel)
+                        fila.append((versao, quiz))
+                        self.gerados += 1
+                except Exception as erro:
+                    self.erros += 1
+                    print(f"\n✗ Erro ao repor quizzes do nível {nivel or 'misto'}: {erro!r}")
+
+    def metricas(self):
+        return {
+            "profundidade": {nivel or "misto": len(fila) for nivel, fila in self._filas.items()},
+            "entregues": self.entregues,
+            "faltas": self.faltas,
+            "gerados": self.gerados,
+            "descartados": self.descartados,
+            "erros": self.erros,
+        }
+
+pool_quizzes = PoolQuizzes()
+
 # -----------------------------------
 # GERAR TESTE (10 questões aleatórias)
 # -----------------------------------
-def gerar_quiz(nivel=None):
-    db = conectar()
-    cursor = db.cursor()
+@instrumentado("gerar_quiz")
+def gerar_quiz(nivel=None, usuario_id=None, evitar_duplicatas=True):
+    """Sorteia 10 questões; com `usuario_id`, prioriza as que ele ainda não viu.
 
-    if nivel:
-        cursor.execute("SELECT * FROM questoes WHERE nivel=? ORDER BY RANDOM() LIMIT 10", (nivel,))
-    else:
-        cursor.execute("SELECT * FROM questoes ORDER BY RANDOM() LIMIT 10")
-    
-    questoes = cursor.fetchall()
-    
-    db.close()
-    
-    # Converte para lista de dicionários
-    quiz = []
-    for q in questoes:
-        quiz.append({
-            'id': q[0],
-            'pergunta': q[1],
-            'alternativaA': q[2],
-            'alternativaB': q[3],
-            'alternativaC': q[4],
-            'alternativaD': q[5],
-            'correta': q[6],
-            'nivel': q[7]
-        })
-    
+    Com `evitar_duplicatas`, o quiz não traz duas questões do mesmo grupo de
+    quase duplicatas enquanto houver outras no nível.
+    """
+    with conectar() as db:
+        _banco_questoes.atualizar(db)
+        # Lista de referências aos registros compartilhados do banco
+        quiz = pool_quizzes.retirar(nivel, _banco_questoes.versao)
+        if usuario_id is None:
+            if quiz is None:
+                quiz = _banco_questoes.sortear(nivel, QUESTOES_POR_QUIZ)
+                if evitar_duplicatas:
+                    quiz = _banco_questoes.sem_duplicatas(quiz, nivel)
+            return quiz
+        # O quiz pronto serve de primeiros candidatos; os já vistos são trocados
+        mapa = questoes_vistas.obter(usuario_id)
+        quiz = _banco_questoes.sortear_ineditas(mapa, nivel, QUESTOES_POR_QUIZ,
+                                                [q.id for q in quiz or ()], evitar_duplicatas)
+    questoes_vistas.ajustar(usuario_id)
     return quiz
 
+def questoes_por_ids(ids):
+    with conectar() as db:
+        _banco_questoes.atualizar(db)
+    return _banco_questoes.obter(ids)
+
 # -----------------------------------
 # REALIZAR TESTE
 # -----------------------------------
 def fazer_teste(quiz):
+    """Aplica o quiz e devolve (acertos, respostas).
+
+    Cada resposta é (questao_id, letra escolhida, 1 se acertou, tempo em ms).
+    """
     acertos = 0
+    respostas = []
     print("\n" + "="*50)
     print("INICIANDO TESTE - 10 QUESTÕES")
     print("="*50)
 
     for i, q in enumerate(quiz, 1):
-        print(f"\n[Questão {i}/10] - Nível: {q['nivel'].upper()}")
-        print(f"{q['pergunta']}")
-        print(f"A) {q['alternativaA']}")
-        print(f"B) {q['alternativaB']}")
-        print(f"C) {q['alternativaC']}")
-        print(f"D) {q['alternativaD']}")
+        print(f"\n[Questão {i}/10] - Nível: {q.nivel.upper()}")
+        print(f"{q.pergunta}")
+        for letra, alternativa in zip(LETRAS, q.alternativas):
+            print(f"{letra}) {alternativa}")
 
+        inicio = time.perf_counter()
         while True:
             resp = input("\nSua resposta (A/B/C/D): ").strip().upper()
             if resp in ['A', 'B', 'C', 'D']:
                 break
             print("Resposta inválida! Digite A, B, C ou D.")
+        tempo_ms = int((time.perf_counter() - inicio) * 1000)
 
-        if resp == q["correta"]:
+        acertou = resp == q.letra_correta
+        respostas.append((q.id, resp, int(acertou), tempo_ms))
+        if acertou:
             acertos += 1
             print("✓ Correto!")
         else:
-            print(f"✗ Errado! A resposta correta era: {q['correta']}")
+            print(f"✗ Errado! A resposta correta era: {q.letra_correta}")
 
     print("\n" + "="*50)
     print(f"RESULTADO FINAL: {acertos}/10 ({acertos*10}%)")
     print("="*50)
     
-    return acertos
+    return acertos, respostas
+
+# -----------------------------------
+# SALVAR RESULTADO (GRAVAÇÃO EM LOTE)
+# -----------------------------------
+LOTE_RESULTADOS = 500        # grava ao juntar esta quantidade...
+INTERVALO_RESULTADOS = 0.05  # ...ou após este tempo (segundos)
+TENTATIVAS_GRAVACAO = 3
+ESPERA_MAX_GRAVACAO = 30     # segundos que aguardar=True espera pelo commit
+_FECHAR_LOTE = object()      # marcador na fila: alguém espera, grava sem esperar o intervalo
+
+class ErroGravacao(RuntimeError):
+    """O resultado não foi gravado (falha no lote ou espera esgotada)."""
+
+class ResultadoPendente:
+    __slots__ = ("usuario_id", "nota", "nivel", "respostas", "gravado", "id", "particao", "erro")
+
+    def __init__(self, usuario_id, nota, nivel=None, respostas=None, gravado=None):
+        self.usuario_id = usuario_id
+        self.nota = nota
+        self.nivel = nivel
+        self.respostas = respostas or ()
+        self.gravado = gravado
+        self.id = None       # id em resultados, único dentro da partição
+        self.particao = None
+        self.erro = None     # motivo da falha, se o lote não foi gravado
+
+@instrumentado("gravar_lote_resultados")
+def gravar_lote(lote, ouvintes=()):
+    """Grava ResultadoPendente com uma transação por partição, em paralelo.
+
+    Cada função em `ouvintes` recebe os resultados gravados já com os ids.
+    Os que não foram gravados ficam com `erro` preenchido. Devolve
+    (partições gravadas, partições com falha, bloqueios encontrados).
+    """
+    caminhos = caminhos_particoes()
+    grupos = {}
+    for resultado in lote:
+        resultado.particao = particao_do_usuario(resultado.usuario_id, len(caminhos))
+        grupos.setdefault(resultado.particao, []).append(resultado)
+
+    gravados = []
+    gravadas = falhas = bloqueios = 0
+    for grupo, (gravou, bloqueios_particao, erro) in em_paralelo(
+        lambda item: (item[1], gravar_particao(caminhos[item[0]], item[1])), grupos.items()
+    ):
+        bloqueios += bloqueios_particao
+        if gravou:
+            gravadas += 1
+            gravados.extend(grupo)
+        else:
+            falhas += 1
+            for resultado in grupo:
+                resultado.erro = erro
+
+    if gravados:
+        for ouvinte in ouvintes:
+            try:
+                ouvinte(gravados)
+            except Exception as erro:
+                print(f"\n✗ Erro ao processar resultados gravados: {erro}")
+    return gravadas, falhas, bloqueios
+
+def gravar_particao(caminho, lote):
+    """Grava o lote numa partição; devolve (gravou, bloqueios encontrados, erro).
+
+    Se alguém aguarda um resultado do lote, o commit é feito com
+    synchronous=FULL: com WAL e NORMAL o commit não passa por fsync e
+    poderia se perder numa queda de energia.
+    """
+    bloqueios = 0
+    duravel = any(r.gravado for r in lote)
+    for tentativa in range(1, TENTATIVAS_GRAVACAO + 1):
+        try:
+            if duravel:
+                conectar(caminho).obter().execute("PRAGMA synchronous=FULL")
+            with conectar(caminho) as db:
+                cursor = db.cursor()
+                cursor.executemany(
+                    "INSERT INTO resultados (usuario_id, nota, nivel) VALUES (?, ?, ?)",
+                    [(r.usuario_id, r.nota, r.nivel) for r in lote],
+                )
+                # Um único escritor por transação: os ids gerados são consecutivos
+                ultimo_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+                for resultado_id, resultado in enumerate(lote, ultimo_id - len(lote) + 1):
+                    resultado.id = resultado_id
+                cursor.executemany(
+                    SQL_ATUALIZAR_ESTATISTICAS,
+                    resumir_notas((r.usuario_id, r.nota) for r in lote),
+                )
+                if any(r.respostas for r in lote):
+                    cursor.executemany(SQL_INSERIR_RESPOSTA, (
+                        (r.id, r.usuario_id, *resposta) for r in lote for resposta in r.respostas
+                    ))
+                    cursor.executemany(SQL_ATUALIZAR_ESTATISTICAS_QUESTAO, resumir_respostas(lote))
+            return True, bloqueios, None
+        except sqlite3.OperationalError as erro:
+            if "locked" in str(erro):
+                bloqueios += 1
+            if tentativa == TENTATIVAS_GRAVACAO:
+                print(f"\n✗ Falha ao gravar {len(lote)} resultados: {erro}")
+                return False, bloqueios, str(erro)
+            time.sleep(0.1 * tentativa)
+        except Exception as erro:
+            # Erro que uma nova tentativa não resolve
+            print(f"\n✗ Falha ao gravar {len(lote)} resultados: {erro!r}")
+            return False, bloqueios, repr(erro)
+        finally:
+            if duravel:
+                conectar(caminho).obter().execute(f"PRAGMA synchronous={SYNCHRONOUS_PADRAO}")
+
+class FilaResultados:
+    """Fila de resultados gravados em lote por uma thread de fundo.
+
+    Cada lote vira uma única transação (um único commit) por partição, em
+    vez de um commit por teste finalizado; com várias partições as
+    transações correm em paralelo, cada uma no seu arquivo. Após o commit,
+    cada função em `ouvintes` recebe os resultados gravados já com os ids.
+    """
+
+    def __init__(self, tamanho_lote=LOTE_RESULTADOS, intervalo=INTERVALO_RESULTADOS):
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.ouvintes = []
+        self._condicao = threading.Condition()
+        self._pid = None
+        self._encerrada = False
+        self.lotes = 0
+        self.falhas = 0       # lotes descartados após todas as tentativas
+        self.bloqueios = 0    # tentativas que encontraram "database is locked"
+
+    def _preparar(self):
+        # Chamado com a condição adquirida; recria o estado após um fork
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._fila = queue.Queue()
+        self._pendentes = {}
+        self._total_pendente = 0
+        self._thread = threading.Thread(target=self._executar, name="fila-resultados", daemon=True)
+        self._thread.start()
+
+    def adicionar(self, usuario_id, nota, nivel=None, respostas=None, aguardar=False):
+        item = ResultadoPendente(usuario_id, nota, nivel, respostas, threading.Event() if aguardar else None)
+        with self._condicao:
+            if self._encerrada:
+                self._gravar([item])
+                if item.gravado and item.erro:
+                    raise ErroGravacao(f"resultado não gravado: {item.erro}")
+                return
+            self._preparar()
+            self._pendentes[usuario_id] = self._pendentes.get(usuario_id, 0) + 1
+            self._total_pendente += 1
+            self._fila.put(item)
+        if item.gravado:
+            if not item.gravado.wait(ESPERA_MAX_GRAVACAO):
+                raise ErroGravacao(f"resultado não gravado em {ESPERA_MAX_GRAVACAO} s")
+            if item.erro:
+                raise ErroGravacao(f"resultado não gravado: {item.erro}")
+
+    def aguardar_usuario(self, usuario_id, timeout=None):
+        with self._condicao:
+            if self._pid != os.getpid():
+                return True
+            if usuario_id in self._pendentes:
+                self._fila.put(_FECHAR_LOTE)
+            return self._condicao.wait_for(lambda: usuario_id not in self._pendentes, timeout)
+
+    def descarregar(self, timeout=None):
+        with self._condicao:
+            if self._pid != os.getpid():
+                return True
+            if self._total_pendente:
+                self._fila.put(_FECHAR_LOTE)
+            return self._condicao.wait_for(lambda: self._total_pendente == 0, timeout)
+
+    def encerrar(self):
+        with self._condicao:
+            if self._encerrada:
+                return
+            self._encerrada = True
+            ativa = self._pid == os.getpid()
+        if ativa:
+            self._fila.put(None)
+            self._thread.join()
+
+    def _executar(self):
+        fila = self._fila
+        encerrar = False
+        while not encerrar:
+            item = fila.get()
+            if item is None:
+                break
+            if item is _FECHAR_LOTE:
+                continue
+            lote = [item]
+            # Com alguém esperando (aguardar=True ou estatísticas), o lote
+            # leva só o que já está na fila, sem esperar o intervalo
+            urgente = item.gravado is not None
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.tamanho_lote:
+                restante = limite - time.monotonic()
+                try:
+                    item = fila.get(timeout=restante) if restante > 0 and not urgente else fila.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    encerrar = True
+                    break
+                if item is _FECHAR_LOTE:
+                    urgente = True
+                    continue
+                lote.append(item)
+                urgente = urgente or item.gravado is not None
+            # Uma falha inesperada não pode matar a thread nem deixar
+            # quem aguarda este lote bloqueado para sempre
+            try:
+                self._gravar(lote)
+            except Exception as erro:
+                print(f"\n✗ Erro ao gravar lote de {len(lote)} resultados: {erro!r}")
+                self.falhas += 1
+                for resultado in lote:
+                    resultado.erro = resultado.erro or repr(erro)
+            finally:
+                self._concluir(lote)
+
+    def _gravar(self, lote):
+        lotes, falhas, bloqueios = gravar_lote(lote, self.ouvintes)
+        self.contar(lotes, falhas, bloqueios)
+
+    def contar(self, lotes, falhas, bloqueios):
+        self.lotes += lotes
+        self.falhas += falhas
+        self.bloqueios += bloqueios
+
+    def _concluir(self, lote):
+        with self._condicao:
+            for usuario_id in (r.usuario_id for r in lote):
+                restantes = self._pendentes[usuario_id] - 1
+                if restantes:
+                    self._pendentes[usuario_id] = restantes
+                else:
+                    del self._pendentes[usuario_id]
+            self._total_pendente -= len(lote)
+            self._condicao.notify_all()
+        for resultado in lote:
+            if resultado.gravado:
+                resultado.gravado.set()
+
+_fila_resultados = FilaResultados()
+# Na saída o executor das partições já foi desligado; em_paralelo então
+# grava as partições em sequência, na própria thread da fila
+atexit.register(_fila_resultados.encerrar)
+
+def validar_respostas(respostas):
+    """Normaliza [(questao_id, escolhida, correta, tempo_ms)] antes de entrar na fila.
+
+    Entradas inválidas são recusadas aqui, para o chamador, e não dentro da
+    thread que grava o lote.
+    """
+    validas = []
+    for questao_id, escolhida, correta, tempo_ms in respostas or ():
+        escolhida = str(escolhida or "").strip().upper()
+        if len(escolhida) != 1 or escolhida not in LETRAS:
+            raise ValueError(f"resposta '{escolhida}' não está entre A e D")
+        if correta not in (0, 1):
+            raise ValueError(f"correta deve ser 0 ou 1, não {correta!r}")
+        validas.append((int(questao_id), escolhida, int(correta), None if tempo_ms is None else int(tempo_ms)))
+    return validas
+
+@instrumentado("salvar_resultado")
+def salvar_resultado(user_id, nota, nivel=None, respostas=None, aguardar=False):
+    # aguardar=True só retorna depois do commit do lote que contém o resultado
+    _fila_resultados.adicionar(user_id, nota, nivel, validar_respostas(respostas), aguardar)
+
+def gravar_resultados(linhas):
+    """Grava (usuario_id, nota, nivel) em massa, sem passar pela fila.
+
+    Usado em cargas como a correção em lote: uma transação por partição,
+    com estatísticas e classificação atualizadas como no caminho normal.
+    Devolve os ResultadoPendente na ordem de `linhas`; os que não foram
+    gravados têm `erro` preenchido.
+    """
+    lote = [ResultadoPendente(usuario_id, nota, nivel) for usuario_id, nota, nivel in linhas]
+    _fila_resultados.contar(*gravar_lote(lote, _fila_resultados.ouvintes))
+    return lote
+
+def aguardar_gravacoes(timeout=None):
+    """Espera a fila de resultados esvaziar e devolve seus contadores."""
+    fila = _fila_resultados
+    fila.descarregar(timeout)
+    return {"lotes": fila.lotes, "falhas": fila.falhas, "bloqueios": fila.bloqueios}
 
 # -----------------------------------
-# SALVAR RESULTADO
+# ESTATÍSTICAS INCREMENTAIS POR USUÁRIO
 # -----------------------------------
-def salvar_resultado(user_id, nota):
-    db = conectar()
-    cursor = db.cursor()
+ULTIMAS_NOTAS = 10  # tamanho da média móvel
+
+# Cada nota (0-10) ocupa um caractere hexadecimal em "ultimas"
+SQL_ATUALIZAR_ESTATISTICAS = f"""
+    INSERT INTO estatisticas_usuario (usuario_id, total, soma, minima, maxima, ultimas)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(usuario_id) DO UPDATE SET
+        total = total + excluded.total,
+        soma = soma + excluded.soma,
+        minima = MIN(minima, excluded.minima),
+        maxima = MAX(maxima, excluded.maxima),
+        ultimas = substr(ultimas || excluded.ultimas, -{ULTIMAS_NOTAS})
+"""
+
+def resumir_notas(linhas):
+    """Agrupa (usuario_id, nota) por usuário, na ordem em que foram salvas."""
+    resumo = {}
+    for usuario_id, nota in linhas:
+        atual = resumo.get(usuario_id)
+        if atual is None:
+            resumo[usuario_id] = [usuario_id, 1, nota, nota, nota, format(nota, "x")]
+        else:
+            atual[1] += 1
+            atual[2] += nota
+            atual[3] = min(atual[3], nota)
+            atual[4] = max(atual[4], nota)
+            atual[5] = (atual[5] + format(nota, "x"))[-ULTIMAS_NOTAS:]
+    return list(resumo.values())
+
+def reconstruir_estatisticas():
+    """Recalcula estatisticas_usuario a partir de toda a tabela resultados."""
+    _fila_resultados.descarregar()
 
-    cursor.execute("INSERT INTO resultados (usuario_id, nota) VALUES (?, ?)", (user_id, nota))
+    def reconstruir(caminho):
+        with conectar(caminho) as db:
+            return _reconstruir_estatisticas_em(db.cursor())
+    return sum(em_paralelo(reconstruir, caminhos_particoes()))
+
+def _reconstruir_estatisticas_em(cursor):
+    cursor.execute("DELETE FROM estatisticas_usuario")
+    cursor.execute("""
+        INSERT INTO estatisticas_usuario (usuario_id, total, soma, minima, maxima)
+        SELECT usuario_id, COUNT(*), SUM(nota), MIN(nota), MAX(nota)
+        FROM resultados
+        GROUP BY usuario_id
+    """)
+    ultimas = {}
+    cursor.execute(f"""
+        SELECT usuario_id, nota FROM (
+            SELECT usuario_id, nota, id,
+                   ROW_NUMBER() OVER (PARTITION BY usuario_id ORDER BY id DESC) AS posicao
+            FROM resultados
+        )
+        WHERE posicao <= {ULTIMAS_NOTAS}
+        ORDER BY usuario_id, id
+    """)
+    for usuario_id, nota in cursor.fetchall():
+        ultimas[usuario_id] = ultimas.get(usuario_id, "") + format(nota, "x")
+    cursor.executemany(
+        "UPDATE estatisticas_usuario SET ultimas=? WHERE usuario_id=?",
+        [(notas, usuario_id) for usuario_id, notas in ultimas.items()],
+    )
+    return cursor.execute("SELECT COUNT(*) FROM estatisticas_usuario").fetchone()[0]
+
+@instrumentado("ver_estatisticas")
+def obter_estatisticas(user_id):
+    # Garante que resultados ainda na fila deste usuário entrem na conta;
+    # se a fila não andar, responde com o que já está gravado
+    if not _fila_resultados.aguardar_usuario(user_id, ESPERA_MAX_GRAVACAO):
+        print(f"\n⚠ Resultados do usuário {user_id} ainda na fila; estatísticas podem estar incompletas.")
+
+    with conectar(caminho_do_usuario(user_id)) as db:
+        cursor = db.cursor()
+        cursor.execute(
+            "SELECT total, soma, minima, maxima, ultimas FROM estatisticas_usuario WHERE usuario_id=?",
+            (user_id,),
+        )
+        linha = cursor.fetchone()
 
-    db.commit()
-    db.close()
+    if linha is None:
+        return None
+    total, soma, minima, maxima, ultimas = linha
+    notas_recentes = [int(c, 16) for c in ultimas]
+    return {
+        "total_testes": total,
+        "media": soma / total,
+        "melhor_nota": maxima,
+        "pior_nota": minima,
+        "media_recente": sum(notas_recentes) / len(notas_recentes) if notas_recentes else None,
+        "testes_recentes": len(notas_recentes),
+    }
 
 # -----------------------------------
 # VER ESTATÍSTICAS DO USUÁRIO
 # -----------------------------------
 def ver_estatisticas(user_id):
-    db = conectar()
-    cursor = db.cursor()
+    stats = obter_estatisticas(user_id)
 
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_testes,
-            AVG(nota) as media,
-            MAX(nota) as melhor_nota,
-            MIN(nota) as pior_nota
-        FROM resultados 
-        WHERE usuario_id=?
-    """, (user_id,))
-    
-    stats = cursor.fetchone()
-    
-    db.close()
-
-    if stats[0] == 0:
+    if stats is None:
         print("\n✗ Você ainda não realizou nenhum teste.")
     else:
         print("\n" + "="*50)
         print("SUAS ESTATÍSTICAS")
         print("="*50)
-        print(f"Total de testes realizados: {stats[0]}")
-        print(f"Média geral: {stats[1]:.1f}/10 ({stats[1]*10:.1f}%)")
-        print(f"Melhor nota: {stats[2]}/10")
-        print(f"Pior nota: {stats[3]}/10")
+        print(f"Total de testes realizados: {stats['total_testes']}")
+        print(f"Média geral: {stats['media']:.1f}/10 ({stats['media']*10:.1f}%)")
+        print(f"Média dos últimos {stats['testes_recentes']} testes: {stats['media_recente']:.1f}/10")
+        print(f"Melhor nota: {stats['melhor_nota']}/10")
+        print(f"Pior nota: {stats['pior_nota']}/10")
         print("="*50)
 
+# -----------------------------------
+# ANÁLISE DAS QUESTÕES (DIFICULDADE E DISCRIMINAÇÃO)
+# -----------------------------------
+MIN_RESPOSTAS_ANALISE = 30
+
+SQL_INSERIR_RESPOSTA = """
+    INSERT INTO respostas (resultado_id, usuario_id, questao_id, escolhida, correta, tempo_ms)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+SQL_ATUALIZAR_ESTATISTICAS_QUESTAO = """
+    INSERT INTO estatisticas_questao (
+        questao_id, respostas, acertos, escolhas_a, escolhas_b, escolhas_c, escolhas_d,
+        soma_resto, soma_resto2, soma_acerto_resto, soma_tempo_ms
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(questao_id) DO UPDATE SET
+        respostas = respostas + excluded.respostas,
+        acertos = acertos + excluded.acertos,
+        escolhas_a = escolhas_a + excluded.escolhas_a,
+        escolhas_b = escolhas_b + excluded.escolhas_b,
+        escolhas_c = escolhas_c + excluded.escolhas_c,
+        escolhas_d = escolhas_d + excluded.escolhas_d,
+        soma_resto = soma_resto + excluded.soma_resto,
+        soma_resto2 = soma_resto2 + excluded.soma_resto2,
+        soma_acerto_resto = soma_acerto_resto + excluded.soma_acerto_resto,
+        soma_tempo_ms = soma_tempo_ms + excluded.soma_tempo_ms
+"""
+
+def resumir_respostas(lote):
+    """Soma, por questão, as contagens e produtos usados na análise.
+
+    O "resto" é a nota do teste sem a própria questão; a correlação entre
+    acertar a questão e o resto (ponto-bisserial) é o índice de discriminação.
+    """
+    resumo = {}
+    for resultado in lote:
+        for questao_id, escolhida, correta, tempo_ms in resultado.respostas:
+            resto = resultado.nota - correta
+            linha = resumo.get(questao_id)
+            if linha is None:
+                linha = resumo[questao_id] = [questao_id, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+            linha[1] += 1
+            linha[2] += correta
+            linha[3 + LETRAS.index(escolhida)] += 1
+            linha[7] += resto
+            linha[8] += resto * resto
+            linha[9] += correta * resto
+            linha[10] += tempo_ms or 0
+    return list(resumo.values())
+
+def reconstruir_analise_questoes():
+    """Recalcula estatisticas_questao a partir de toda a tabela respostas."""
+    _fila_resultados.descarregar()
+
+    def reconstruir(caminho):
+        with conectar(caminho) as db:
+            return _reconstruir_analise_em(db.cursor())
+    return len(set().union(*em_paralelo(reconstruir, caminhos_particoes())))
+
+def _reconstruir_analise_em(cursor):
+    cursor.execute("DELETE FROM estatisticas_questao")
+    cursor.execute("""
+        INSERT INTO estatisticas_questao
+        SELECT r.questao_id, COUNT(*), SUM(r.correta),
+               SUM(r.escolhida = 'A'), SUM(r.escolhida = 'B'),
+               SUM(r.escolhida = 'C'), SUM(r.escolhida = 'D'),
+               SUM(t.nota - r.correta), SUM((t.nota - r.correta) * (t.nota - r.correta)),
+               SUM(r.correta * (t.nota - r.correta)), COALESCE(SUM(r.tempo_ms), 0)
+        FROM respostas r JOIN resultados t ON t.id = r.resultado_id
+        GROUP BY r.questao_id
+    """)
+    return [linha[0] for linha in cursor.execute("SELECT questao_id FROM estatisticas_questao")]
+
+def somar_estatisticas_questao():
+    """Somatórios de estatisticas_questao de todas as partições, por questão."""
+    def ler(caminho):
+        with conectar(caminho) as db:
+            return db.execute("SELECT * FROM estatisticas_questao").fetchall()
+
+    somas = {}
+    for linhas in em_paralelo(ler, caminhos_particoes()):
+        for questao_id, *valores in linhas:
+            atual = somas.get(questao_id)
+            somas[questao_id] = valores if atual is None else [x + y for x, y in zip(atual, valores)]
+    return somas
+
+def analisar_questoes(min_respostas=MIN_RESPOSTAS_ANALISE):
+    """Indicadores por questão calculados a partir dos somatórios mantidos."""
+    _fila_resultados.descarregar()
+    somas = somar_estatisticas_questao()
+    with conectar() as db:
+        questoes = {id_questao: (correta, nivel) for id_questao, correta, nivel
+                    in db.execute("SELECT id, correta, nivel FROM questoes")}
+
+    analise = []
+    for questao_id, valores in somas.items():
+        if valores[0] < min_respostas or questao_id not in questoes:
+            continue
+        n, acertos, a, b, c, d, soma_resto, soma_resto2, soma_acerto_resto, soma_tempo_ms = valores
+        correta, nivel = questoes[questao_id]
+        acerto = acertos / n
+        media_resto = soma_resto / n
+        variancia = (acerto * (1 - acerto)) * (soma_resto2 / n - media_resto ** 2)
+        covariancia = soma_acerto_resto / n - acerto * media_resto
+        discriminacao = covariancia / variancia ** 0.5 if variancia > 0 else None
+
+        distribuicao = dict(zip(LETRAS, (x / n for x in (a, b, c, d))))
+        alertas = []
+        mais_escolhida = max(distribuicao, key=distribuicao.get)
+        if correta in distribuicao and mais_escolhida != correta:
+            alertas.append(f"alternativa {mais_escolhida} mais escolhida que a correta ({correta})")
+        if discriminacao is not None and discriminacao < 0:
+            alertas.append("discriminação negativa")
+        if nivel == "basico" and acerto < 0.3:
+            alertas.append("difícil demais para o nível básico")
+        elif nivel == "avancado" and acerto > 0.9:
+            alertas.append("fácil demais para o nível avançado")
+
+        analise.append({
+            "questao_id": questao_id,
+            "nivel": nivel,
+            "respostas": n,
+            "acerto": acerto,
+            "distribuicao": distribuicao,
+            "discriminacao": discriminacao,
+            "tempo_medio_ms": soma_tempo_ms / n,
+            "alertas": alertas,
+        })
+    return analise
+
+def ver_analise_questoes(min_respostas=MIN_RESPOSTAS_ANALISE):
+    analise = [q for q in analisar_questoes(min_respostas) if q["alertas"]]
+    if not analise:
+        print(f"✓ Nenhuma questão suspeita (mínimo de {min_respostas} respostas).")
+        return
+
+    print("\n" + "="*50)
+    print(f"QUESTÕES SUSPEITAS ({len(analise)})")
+    print("="*50)
+    for q in sorted(analise, key=lambda q: q["discriminacao"] if q["discriminacao"] is not None else 0):
+        discriminacao = f"{q['discriminacao']:.2f}" if q["discriminacao"] is not None else "-"
+        print(f"#{q['questao_id']} [{q['nivel']}] {q['respostas']} respostas, "
+              f"acerto {q['acerto']*100:.0f}%, discriminação {discriminacao}")
+        for alerta in q["alertas"]:
+            print(f"   - {alerta}")
+    print("="*50)
+
+# -----------------------------------
+# CLASSIFICAÇÃO (RANKING) E PERCENTIS
+# -----------------------------------
+JANELAS = ("total", "mes", "semana", "dia")
+CRITERIOS = ("media", "melhor")
+TODOS_NIVEIS = "todos"
+
+class Classificacao:
+    """Usuários distribuídos em baldes por nota, dentro de uma janela de tempo.
+
+    Como as notas vão de 0 a 10, bastam 11 baldes para a melhor nota e 101
+    para a média (uma casa decimal). Posição e percentil somam o tamanho dos
+    baldes; o top-K percorre os baldes do maior para o menor.
+    """
+
+    def __init__(self):
+        self.usuarios = {}  # usuario_id -> [testes, soma, melhor]
+        self.baldes = {"melhor": [set() for _ in range(11)], "media": [set() for _ in range(101)]}
+
+    @staticmethod
+    def _balde(criterio, dados):
+        testes, soma, melhor = dados
+        return melhor if criterio == "melhor" else round(soma * 10 / testes)
+
+    def acumular(self, usuario_id, testes, soma, melhor):
+        dados = self.usuarios.get(usuario_id)
+        if dados is None:
+            dados = self.usuarios[usuario_id] = [0, 0, 0]
+        else:
+            for criterio, baldes in self.baldes.items():
+                baldes[self._balde(criterio, dados)].discard(usuario_id)
+        dados[0] += testes
+        dados[1] += soma
+        dados[2] = max(dados[2], melhor)
+        for criterio, baldes in self.baldes.items():
+            baldes[self._balde(criterio, dados)].add(usuario_id)
+
+    def posicao(self, usuario_id, criterio="media"):
+        dados = self.usuarios.get(usuario_id)
+        if dados is None:
+            return None
+        baldes = self.baldes[criterio]
+        balde = self._balde(criterio, dados)
+        acima = sum(len(b) for b in baldes[balde + 1:])
+        abaixo = sum(len(b) for b in baldes[:balde])
+        empatados = len(baldes[balde])
+        total = len(self.usuarios)
+        return {
+            "posicao": acima + 1,
+            "total": total,
+            "percentil": 100 * (abaixo + 0.5 * empatados) / total,
+        }
+
+    def melhores(self, k=10, criterio="media"):
+        usuarios = self.usuarios
+        if criterio == "melhor":
+            chave = lambda u: (-usuarios[u][2], -usuarios[u][1] / usuarios[u][0], u)
+        else:
+            chave = lambda u: (-usuarios[u][1] / usuarios[u][0], -usuarios[u][2], u)
+        resultado = []
+        for balde in reversed(self.baldes[criterio]):
+            if len(resultado) >= k:
+                break
+            if balde:
+                resultado.extend(heapq.nsmallest(k - len(resultado), balde, key=chave))
+        return [(u, usuarios[u][1] / usuarios[u][0], usuarios[u][2], usuarios[u][0]) for u in resultado]
+
+class Ranking:
+    """Classificações por nível e janela, atualizadas a cada lote gravado.
+
+    As janelas "mes", "semana" e "dia" são períodos do calendário (UTC); ao
+    virar o período a classificação correspondente recomeça vazia.
+    """
+
+    def __init__(self):
+        self._classificacoes = {}  # (nivel, janela) -> (periodo, Classificacao)
+        self._ultimo_id = None     # partição -> último id de resultados já contado
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def periodo(janela, quando):
+        if janela == "mes":
+            return quando.strftime("%Y-%m")
+        if janela == "semana":
+            ano, semana, _ = quando.isocalendar()
+            return f"{ano}-W{semana:02d}"
+        if janela == "dia":
+            return quando.strftime("%Y-%m-%d")
+        return None
+
+    def _classificacao(self, nivel, janela, agora):
+        periodo = self.periodo(janela, agora)
+        atual = self._classificacoes.get((nivel, janela))
+        if atual is None or atual[0] != periodo:
+            atual = self._classificacoes[(nivel, janela)] = (periodo, Classificacao())
+        return atual[1]
+
+    def _acumular(self, usuario_id, nivel, testes, soma, melhor, quando, agora, janelas=JANELAS):
+        for chave in (TODOS_NIVEIS, nivel) if nivel else (TODOS_NIVEIS,):
+            for janela in janelas:
+                if self.periodo(janela, quando) == self.periodo(janela, agora):
+                    self._classificacao(chave, janela, agora).acumular(usuario_id, testes, soma, melhor)
+
+    def carregar(self):
+        agora = datetime.now(timezone.utc)
+        inicio_semana = datetime.fromisocalendar(*agora.isocalendar()[:2], 1)
+        corte = min(agora.replace(day=1), inicio_semana.replace(tzinfo=timezone.utc)).strftime("%Y-%m-%d 00:00:00")
+
+        def ler(caminho):
+            # Os ids de cada partição são consecutivos: id <= ultimo_id fixa o
+            # mesmo conjunto de resultados nas duas consultas
+            with conectar(caminho) as db:
+                cursor = db.cursor()
+                ultimo_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM resultados").fetchone()[0]
+                totais = cursor.execute("""
+                    SELECT usuario_id, nivel, COUNT(*), SUM(nota), MAX(nota)
+                    FROM resultados WHERE id <= ?
+                    GROUP BY usuario_id, nivel
+                """, (ultimo_id,)).fetchall()
+                recentes = cursor.execute("""
+                    SELECT usuario_id, nivel, nota, data_hora
+                    FROM resultados WHERE data_hora >= ? AND id <= ?
+                """, (corte, ultimo_id)).fetchall()
+            return ultimo_id, totais, recentes
+
+        with self._lock:
+            self._classificacoes = {}
+            self._ultimo_id = {}
+            for particao, (ultimo_id, totais, recentes) in enumerate(em_paralelo(ler, caminhos_particoes())):
+                for usuario_id, nivel, testes, soma, melhor in totais:
+                    self._acumular(usuario_id, nivel, testes, soma, melhor, agora, agora, ("total",))
+                for usuario_id, nivel, nota, data_hora in recentes:
+                    quando = datetime.fromisoformat(data_hora).replace(tzinfo=timezone.utc)
+                    self._acumular(usuario_id, nivel, 1, nota, nota, quando, agora, JANELAS[1:])
+                self._ultimo_id[particao] = ultimo_id
+
+    def registrar(self, lote):
+        agora = datetime.now(timezone.utc)
+        with self._lock:
+            if self._ultimo_id is None:
+                return
+            for resultado in lote:
+                # Resultados já contados na carga inicial são ignorados
+                if resultado.id > self._ultimo_id.get(resultado.particao, 0):
+                    self._acumular(resultado.usuario_id, resultado.nivel, 1,
+                                   resultado.nota, resultado.nota, agora, agora)
+                    self._ultimo_id[resultado.particao] = resultado.id
+
+    def invalidar(self):
+        # A próxima consulta recarrega tudo do banco
+        with self._lock:
+            self._classificacoes = {}
+            self._ultimo_id = None
+
+    def _consultar(self, nivel, janela):
+        if self._ultimo_id is None:
+            self.carregar()
+        with self._lock:
+            return self._classificacao(nivel or TODOS_NIVEIS, janela, datetime.now(timezone.utc))
+
+    def posicao(self, usuario_id, nivel=None, janela="total", criterio="media"):
+        classificacao = self._consultar(nivel, janela)
+        with self._lock:
+            return classificacao.posicao(usuario_id, criterio)
+
+    def melhores(self, k=10, nivel=None, janela="total", criterio="media"):
+        classificacao = self._consultar(nivel, janela)
+        with self._lock:
+            return classificacao.melhores(k, criterio)
+
+_ranking = Ranking()
+_fila_resultados.ouvintes.append(_ranking.registrar)
+_fila_resultados.ouvintes.append(questoes_vistas.registrar)
+
+def nivel_do_quiz(quiz):
+    niveis = {q.nivel for q in quiz}
+    return niveis.pop() if len(niveis) == 1 else None
+
+def obter_posicao(user_id, nivel=None, janela="total"):
+    return _ranking.posicao(user_id, nivel, janela)
+
+def obter_classificacao(nivel=None, janela="total", k=10):
+    """Top-K da classificação, como dicts com o nome de cada usuário."""
+    melhores = _ranking.melhores(k, nivel, janela)
+    if not melhores:
+        return []
+
+    ids = [usuario_id for usuario_id, *_ in melhores]
+    with conectar() as db:
+        marcadores = ",".join("?" * len(ids))
+        nomes = dict(db.execute(f"SELECT id, usuario FROM usuarios WHERE id IN ({marcadores})", ids))
+
+    return [
+        {
+            "usuario_id": usuario_id,
+            "usuario": nomes.get(usuario_id, f"#{usuario_id}"),
+            "media": media,
+            "melhor_nota": melhor,
+            "testes": testes,
+        }
+        for usuario_id, media, melhor, testes in melhores
+    ]
+
+def mostrar_posicao(user_id, nivel=None, janela="total"):
+    posicao = obter_posicao(user_id, nivel, janela)
+    if posicao:
+        print(f"🏆 Sua posição: {posicao['posicao']}º de {posicao['total']} "
+              f"(percentil {posicao['percentil']:.1f})")
+
+def ver_classificacao(user_id, nivel=None, janela="total", k=10):
+    melhores = obter_classificacao(nivel, janela, k)
+    if not melhores:
+        print("\n✗ Ainda não há resultados nesta classificação.")
+        return
+
+    print("\n" + "="*50)
+    print(f"TOP {k} - {(nivel or 'geral').upper()} ({janela})")
+    print("="*50)
+    for i, linha in enumerate(melhores, 1):
+        marcador = "➜" if linha["usuario_id"] == user_id else " "
+        print(f"{marcador}{i:>3}. {linha['usuario']:<20} média {linha['media']:.1f}  "
+              f"melhor {linha['melhor_nota']}/10  ({linha['testes']} testes)")
+    print("="*50)
+    mostrar_posicao(user_id, nivel, janela)
+
+def concluir_teste(user_id, quiz):
+    nota, respostas = fazer_teste(quiz)
+    nivel = nivel_do_quiz(quiz)
+    try:
+        salvar_resultado(user_id, nota, nivel, respostas, aguardar=True)
+    except ErroGravacao as erro:
+        print(f"\n✗ {erro}")
+        return
+    mostrar_posicao(user_id, nivel)
+
+# -----------------------------------
+# REPARTICIONAMENTO DOS RESULTADOS
+# -----------------------------------
+LOTE_REPARTICAO = 5000
+TABELAS_PARTICAO = ("respostas", "resultados", "estatisticas_usuario", "estatisticas_questao")
+
+def remover_banco(caminho):
+    gerenciador = _gerenciadores.pop(caminho, None)
+    if gerenciador is not None:
+        gerenciador.fechar_todas()
+    for sufixo in ("", "-wal", "-shm"):
+        Path(caminho + sufixo).unlink(missing_ok=True)
+
+def _copiar_particao(origem, destinos):
+    """Copia resultados e respostas de `origem` para os destinos, roteando por usuário.
+
+    Os resultados são lidos em ordem de id e as respostas em ordem de
+    resultado_id, e as duas leituras avançam juntas, lote a lote.
+    """
+    copiados = 0
+    with conectar(origem) as db:
+        resultados = db.execute("SELECT id, usuario_id, nota, data_hora, nivel FROM resultados ORDER BY id")
+        respostas = db.execute("""
+            SELECT resultado_id, usuario_id, questao_id, escolhida, correta, tempo_ms
+            FROM respostas ORDER BY resultado_id, id
+        """)
+        proxima = respostas.fetchone()
+
+        for lote in em_lotes(resultados, LOTE_REPARTICAO):
+            do_lote = {}
+            while proxima is not None and proxima[0] <= lote[-1][0]:
+                do_lote.setdefault(proxima[0], []).append(proxima[1:])
+                proxima = respostas.fetchone()
+
+            grupos = {}
+            for linha in lote:
+                grupos.setdefault(particao_do_usuario(linha[1], len(destinos)), []).append(linha)
+            for indice, linhas in grupos.items():
+                with conectar(destinos[indice]) as destino:
+                    cursor = destino.cursor()
+                    cursor.executemany(
+                        "INSERT INTO resultados (usuario_id, nota, data_hora, nivel) VALUES (?, ?, ?, ?)",
+                        [linha[1:] for linha in linhas],
+                    )
+                    ultimo_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+                    cursor.executemany(SQL_INSERIR_RESPOSTA, (
+                        (novo_id, *resposta)
+                        for novo_id, linha in enumerate(linhas, ultimo_id - len(linhas) + 1)
+                        for resposta in do_lote.get(linha[0], ())
+                    ))
+            copiados += len(lote)
+    return copiados
+
+def reparticionar(total):
+    """Redistribui resultados e respostas em `total` arquivos de partição.
+
+    Com total=0 tudo volta para o banco principal. Deve rodar com o serviço
+    parado: outros processos só enxergam a nova divisão ao reiniciar.
+    """
+    if total < 0:
+        raise ValueError("o número de partições não pode ser negativo")
+    _fila_resultados.descarregar()
+
+    origens = caminhos_particoes()
+    pasta = Path(DB_PATH).parent
+    nomes = [f"{Path(DB_PATH).stem}.p{i}de{total}.db" for i in range(total)]
+    destinos = tuple(str(pasta / nome) for nome in nomes) or (DB_PATH,)
+    if destinos == origens:
+        print(f"✓ Os resultados já estão em {len(destinos)} arquivo(s).")
+        return 0
+
+    # Destinos começam vazios (restos de uma execução interrompida são descartados)
+    for caminho in destinos:
+        if caminho == DB_PATH:
+            with conectar() as db:
+                for tabela in TABELAS_PARTICAO:
+                    db.execute(f"DELETE FROM {tabela}")
+        else:
+            remover_banco(caminho)
+            migrar(caminho, MIGRACOES_PARTICAO)
+
+    inicio = time.perf_counter()
+    copiados = 0
+    for origem in origens:
+        copiados += _copiar_particao(origem, destinos)
+        print(f"\r  {copiados} resultados copiados", end="", flush=True)
+    print()
+
+    def reconstruir(caminho):
+        with conectar(caminho) as db:
+            _reconstruir_estatisticas_em(db.cursor())
+            _reconstruir_analise_em(db.cursor())
+    em_paralelo(reconstruir, destinos)
+
+    # A troca da configuração é o ponto de virada; só depois as origens somem
+    with conectar() as db:
+        db.execute("DELETE FROM particoes_resultados")
+        db.executemany("INSERT INTO particoes_resultados (indice, caminho) VALUES (?, ?)", enumerate(nomes))
+        if DB_PATH in origens:
+            for tabela in TABELAS_PARTICAO:
+                db.execute(f"DELETE FROM {tabela}")
+    _particoes.pop(DB_PATH, None)
+    _ranking.invalidar()
+    for caminho in origens:
+        if caminho != DB_PATH:
+            remover_banco(caminho)
+
+    print(f"✓ {copiados} resultados redistribuídos em {len(destinos)} arquivo(s) "
+          f"em {time.perf_counter() - inicio:.1f} s")
+    return copiados
+
+# -----------------------------------
+# SESSÕES (QUIZ ATUAL E ÚLTIMO QUIZ)
+# -----------------------------------
+MAX_SESSOES = 100_000
+TEMPO_MAX_OCIOSO = 30 * 60  # segundos sem uso até a sessão sair da memória
+
+class Sessao:
+    """Estado de quiz de um usuário, guardando só ids de questões.
+
+    `respostas` tem um byte por questão (0 enquanto não respondida) e
+    `tempos` o tempo de resposta em ms, ambos na ordem do quiz.
+    """
+
+    __slots__ = ("usuario_id", "quiz", "respostas", "tempos", "ultimo_quiz", "acesso")
+
+    def __init__(self, usuario_id, quiz=None, respostas=None, tempos=None, ultimo_quiz=None):
+        self.usuario_id = usuario_id
+        self.quiz = quiz
+        self.respostas = respostas
+        self.tempos = tempos
+        self.ultimo_quiz = ultimo_quiz
+        self.acesso = time.monotonic()
+
+    def iniciar_quiz(self, questoes):
+        self.quiz = array("I", (q.id for q in questoes))
+        self.respostas = bytearray(len(self.quiz))
+        self.tempos = array("I", bytes(4 * len(self.quiz)))
+
+    def responder(self, questao_id, letra, tempo_ms=None):
+        if self.quiz is None or questao_id not in self.quiz:
+            raise ValueError("questão não pertence ao quiz atual")
+        posicao = self.quiz.index(questao_id)
+        if self.respostas[posicao]:
+            raise ValueError("questão já respondida")
+        self.respostas[posicao] = ord(letra)
+        self.tempos[posicao] = max(int(tempo_ms or 0), 0)
+
+    def desfazer(self, questao_id):
+        if self.quiz is not None and questao_id in self.quiz:
+            posicao = self.quiz.index(questao_id)
+            self.respostas[posicao] = 0
+            self.tempos[posicao] = 0
+
+    @property
+    def respondidas(self):
+        return len(self.respostas) - self.respostas.count(0) if self.respostas is not None else 0
+
+    def respostas_dadas(self):
+        for questao_id, letra, tempo_ms in zip(self.quiz, self.respostas, self.tempos):
+            if letra:
+                yield questao_id, chr(letra), tempo_ms
+
+    def concluir(self):
+        self.ultimo_quiz = self.quiz
+        self.quiz = self.respostas = self.tempos = None
+
+    def serializar(self):
+        def blob(valor):
+            return bytes(valor) if isinstance(valor, bytearray) else (valor.tobytes() if valor is not None else None)
+        return (self.usuario_id, blob(self.quiz), blob(self.respostas), blob(self.tempos), blob(self.ultimo_quiz))
+
+    @classmethod
+    def da_linha(cls, linha):
+        usuario_id, quiz, respostas, tempos, ultimo_quiz = linha
+
+        def ids(blob):
+            if blob is None:
+                return None
+            valores = array("I")
+            valores.frombytes(blob)
+            return valores
+        return cls(usuario_id, ids(quiz), bytearray(respostas) if respostas is not None else None,
+                   ids(tempos), ids(ultimo_quiz))
+
+class ArmazemSessoes:
+    """Sessões em memória com limite de quantidade (LRU) e expiração por ociosidade.
+
+    Sessões despejadas ou expiradas vão para a tabela sessoes e voltam na
+    próxima consulta. Cada sessão ocupa um tamanho fixo pequeno (só ids),
+    então o limite de quantidade limita também a memória.
+    """
+
+    def __init__(self, max_sessoes=MAX_SESSOES, tempo_ocioso=TEMPO_MAX_OCIOSO, persistir=True):
+        self.max_sessoes = max_sessoes
+        self.tempo_ocioso = tempo_ocioso
+        self.persistir = persistir
+        self._sessoes = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.carregadas = 0
+        self.despejos = 0
+        self.expiradas = 0
+
+    def obter(self, usuario_id):
+        agora = time.monotonic()
+        with self._lock:
+            sessao = self._sessoes.get(usuario_id)
+            if sessao is not None and agora - sessao.acesso <= self.tempo_ocioso:
+                self.acertos += 1
+                self._sessoes.move_to_end(usuario_id)
+                sessao.acesso = agora
+                return sessao
+            self.falhas += 1
+            if sessao is not None:
+                # Expirou mas ainda estava em memória: continua válida
+                self.expiradas += 1
+                del self._sessoes[usuario_id]
+
+        if sessao is None:
+            sessao = self._carregar(usuario_id) or Sessao(usuario_id)
+        sessao.acesso = agora
+
+        with self._lock:
+            sessao = self._sessoes.setdefault(usuario_id, sessao)
+            self._sessoes.move_to_end(usuario_id)
+            despejadas = self._liberar(agora)
+        self._gravar_varias(despejadas)
+        return sessao
+
+    def _liberar(self, agora):
+        # Chamado com o lock adquirido; remove expiradas (sempre no início
+        # da ordem LRU) e o excesso acima do limite
+        despejadas = []
+        while self._sessoes:
+            usuario_id, sessao = next(iter(self._sessoes.items()))
+            if agora - sessao.acesso > self.tempo_ocioso:
+                self.expiradas += 1
+            elif len(self._sessoes) > self.max_sessoes:
+                self.despejos += 1
+            else:
+                break
+            del self._sessoes[usuario_id]
+            despejadas.append(sessao.serializar())
+        return despejadas
+
+    def _carregar(self, usuario_id):
+        if not self.persistir:
+            return None
+        with conectar() as db:
+            linha = db.execute(
+                "SELECT usuario_id, quiz, respostas, tempos, ultimo_quiz FROM sessoes WHERE usuario_id=?",
+                (usuario_id,),
+            ).fetchone()
+        if linha is None:
+            return None
+        self.carregadas += 1
+        return Sessao.da_linha(linha)
+
+    def _gravar_varias(self, linhas):
+        if not self.persistir or not linhas:
+            return
+        with conectar() as db:
+            db.executemany("""
+                INSERT INTO sessoes (usuario_id, quiz, respostas, tempos, ultimo_quiz) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(usuario_id) DO UPDATE SET
+                    quiz = excluded.quiz, respostas = excluded.respostas, tempos = excluded.tempos,
+                    ultimo_quiz = excluded.ultimo_quiz, atualizado_em = CURRENT_TIMESTAMP
+            """, linhas)
+
+    def gravar(self, sessao):
+        """Grava a sessão no banco já (ao iniciar ou concluir um quiz)."""
+        with self._lock:
+            linha = sessao.serializar()
+        self._gravar_varias([linha])
+
+    def gravar_todas(self):
+        with self._lock:
+            linhas = [sessao.serializar() for sessao in self._sessoes.values()]
+        self._gravar_varias(linhas)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "sessoes": len(self._sessoes),
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "carregadas": self.carregadas,
+                "despejos": self.despejos,
+                "expiradas": self.expiradas,
+            }
+
+sessoes = ArmazemSessoes()
+atexit.register(sessoes.gravar_todas)
+
+def exportar_metricas():
+    """Todas as métricas do processo em formato texto do Prometheus."""
+    fila = _fila_resultados
+    extras = [
+        ("quiz_fila_resultados_total", "counter", "Lotes da fila de resultados por situação.",
+         [({"situacao": "gravado"}, fila.lotes), ({"situacao": "perdido"}, fila.falhas),
+          ({"situacao": "bloqueado"}, fila.bloqueios)]),
+        ("quiz_sessoes", "gauge", "Contadores do armazém de sessões.",
+         [({"tipo": chave}, valor) for chave, valor in sessoes.metricas().items()]),
+        ("quiz_mapas_vistas_bytes", "gauge", "Memória dos mapas de questões vistas em cache.",
+         [({}, questoes_vistas.bytes_em_cache)]),
+    ]
+    pool = pool_quizzes.metricas()
+    extras += [
+        ("quiz_pool_profundidade", "gauge", "Quizzes prontos em cada fila do pool.",
+         [({"nivel": nivel}, valor) for nivel, valor in pool["profundidade"].items()]),
+        ("quiz_pool_total", "counter", "Quizzes do pool por situação (faltas = fila vazia no pedido).",
+         [({"situacao": chave}, pool[chave]) for chave in ("entregues", "faltas", "gerados", "descartados", "erros")]),
+    ]
+    return metricas.exportar_prometheus(extras)
+
 # -----------------------------------
 # MENU PRINCIPAL
 # -----------------------------------
 def menu(user_id):
-    quiz_atual = None
+    sessao = sessoes.obter(user_id)
 
     while True:
         print("""
@@ -381,15 +3045,18 @@ def menu(user_id):
   3 - Refazer último teste
   4 - Gerar novo teste
   5 - Ver estatísticas
-  6 - Sair
+  6 - Ver classificação
+  7 - Sair
 """)
 
         opc = input("Escolha uma opção: ").strip()
 
         if opc == "1":
-            quiz_atual = gerar_quiz()
-            nota = fazer_teste(quiz_atual)
-            salvar_resultado(user_id, nota)
+            quiz_atual = gerar_quiz(usuario_id=user_id)
+            sessao.iniciar_quiz(quiz_atual)
+            concluir_teste(user_id, quiz_atual)
+            sessao.concluir()
+            sessoes.gravar(sessao)
 
         elif opc == "2":
             print("\nEscolha o nível:")
@@ -401,32 +3068,42 @@ def menu(user_id):
             nivel_map = {"1": "basico", "2": "intermediario", "3": "avancado"}
             
             if nivel_opc in nivel_map:
-                quiz_atual = gerar_quiz(nivel_map[nivel_opc])
-                nota = fazer_teste(quiz_atual)
-                salvar_resultado(user_id, nota)
+                quiz_atual = gerar_quiz(nivel_map[nivel_opc], user_id)
+                sessao.iniciar_quiz(quiz_atual)
+                concluir_teste(user_id, quiz_atual)
+                sessao.concluir()
+                sessoes.gravar(sessao)
             else:
                 print("✗ Opção inválida!")
 
         elif opc == "3":
-            if quiz_atual is None:
+            ids = sessao.quiz if sessao.quiz is not None else sessao.ultimo_quiz
+            quiz_atual = questoes_por_ids(ids) if ids is not None else None
+            if not quiz_atual:
                 print("\n✗ Não existe teste criado ainda. Gere um novo teste primeiro.")
             else:
-                nota = fazer_teste(quiz_atual)
-                salvar_resultado(user_id, nota)
+                sessao.iniciar_quiz(quiz_atual)
+                concluir_teste(user_id, quiz_atual)
+                sessao.concluir()
+                sessoes.gravar(sessao)
 
         elif opc == "4":
-            quiz_atual = gerar_quiz()
+            sessao.iniciar_quiz(gerar_quiz(usuario_id=user_id))
+            sessoes.gravar(sessao)
             print("\n✓ Novo teste gerado com sucesso!")
 
         elif opc == "5":
             ver_estatisticas(user_id)
 
         elif opc == "6":
+            ver_classificacao(user_id)
+
+        elif opc == "7":
             print("\n👋 Obrigado por usar o Quiz Python! Até logo!")
             break
 
         else:
-            print("\n✗ Opção inválida! Escolha um número de 1 a 6.")
+            print("\n✗ Opção inválida! Escolha um número de 1 a 7.")
 
 # -----------------------------------
 # TELA INICIAL
@@ -472,10 +3149,89 @@ def tela_inicial():
 # -----------------------------------
 # INICIALIZAÇÃO
 # -----------------------------------
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quiz Python")
+    parser.add_argument("--metricas", metavar="ARQUIVO",
+                        help="grava métricas no formato Prometheus neste arquivo periodicamente")
+    comandos = parser.add_subparsers(dest="comando")
+
+    importar = comandos.add_parser("importar", help="importa questões de um arquivo JSONL ou CSV")
+    importar.add_argument("arquivo")
+    importar.add_argument("--lote", type=int, default=TAMANHO_LOTE_IMPORTACAO,
+                          help="questões gravadas por transação")
+    importar.add_argument("--reiniciar", action="store_true",
+                          help="ignora o progresso salvo e lê o arquivo desde o início")
+    importar.add_argument("--duplicatas", action="store_true",
+                          help="detecta quase duplicatas ao fim da importação (o mesmo que `duplicatas --reconstruir`)")
+
+    comandos.add_parser("reconstruir-estatisticas",
+                        help="recalcula as estatísticas de todos os usuários a partir dos resultados")
+
+    reparticao = comandos.add_parser("reparticionar",
+                                     help="redistribui os resultados em N arquivos (0 = só o banco principal)")
+    reparticao.add_argument("total", type=int, help="número de partições")
+
+    analisar = comandos.add_parser("analisar-questoes",
+                                   help="lista questões com indícios de erro ou nível inadequado")
+    analisar.add_argument("--minimo", type=int, default=MIN_RESPOSTAS_ANALISE,
+                          help="número mínimo de respostas para avaliar uma questão")
+    analisar.add_argument("--reconstruir", action="store_true",
+                          help="recalcula os somatórios a partir da tabela respostas")
+
+    buscar = comandos.add_parser("buscar", help="busca questões pelo texto da pergunta e das alternativas")
+    buscar.add_argument("texto", nargs="+")
+    buscar.add_argument("--limite", type=int, default=20)
+
+    duplicatas = comandos.add_parser("duplicatas", help="lista os grupos de questões quase duplicadas")
+    duplicatas.add_argument("--reconstruir", action="store_true",
+                            help="refaz a detecção sobre todas as questões")
+
+    args = parser.parse_args(argv)
+
+    if args.metricas:
+        ExportadorMetricas(args.metricas).iniciar()
+
     print("Inicializando banco de dados...")
     criar_tabelas()
-    inserir_questoes()
-    
+
+    if args.comando == "importar":
+        importar_questoes(args.arquivo, args.lote, retomar=not args.reiniciar,
+                          duplicatas=args.duplicatas)
+        return
+
+    if args.comando == "reconstruir-estatisticas":
+        total = reconstruir_estatisticas()
+        print(f"✓ Estatísticas recalculadas para {total} usuários.")
+        return
+
+    if args.comando == "reparticionar":
+        reparticionar(args.total)
+        return
+
+    if args.comando == "buscar":
+        try:
+            questoes = buscar_questoes(" ".join(args.texto), args.limite)
+        except BuscaIndisponivel as erro:
+            print(f"✗ {erro}")
+            return
+        for questao in questoes:
+            print(f"#{questao['id']} [{questao['nivel']}] {questao['pergunta']}\n   {questao['trecho']}")
+        return
+
+    if args.comando == "duplicatas":
+        if args.reconstruir:
+            print(f"✓ {detectar_duplicatas()} grupos encontrados.")
+        ver_duplicatas()
+        return
+
+    if args.comando == "analisar-questoes":
+        if args.reconstruir:
+            reconstruir_analise_questoes()
+        ver_analise_questoes(args.minimo)
+        return
+
     user_id = tela_inicial()
-    menu(user_id)
\ No newline at end of file
+    menu(user_id)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
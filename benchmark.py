@@ -0,0 +1,230 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import POOtrab
+
+# -----------------------------------
+# CONFIGURAÇÃO
+# -----------------------------------
+ARQUIVO_SAIDA = "benchmark.jsonl"  # uma linha JSON por execução
+LOTE_SEMENTE = 50_000
+SENHA_PADRAO = "senha-benchmark"
+
+# -----------------------------------
+# BANCO TEMPORÁRIO COM DADOS SINTÉTICOS
+# -----------------------------------
+def gerar_questoes(quantidade, semente):
+    aleatorio = random.Random(semente)
+    for i in range(quantidade):
+        alternativas = [f"Alternativa {letra} da questão {i}" for letra in POOtrab.LETRAS]
+        pergunta = f"Questão sintética número {i}?"
+        yield (pergunta, *alternativas, aleatorio.choice(POOtrab.LETRAS),
+               aleatorio.choice(POOtrab.NIVEIS), POOtrab.hash_questao(pergunta, *alternativas))
+
+def gerar_resultados(quantidade, usuarios, semente):
+    aleatorio = random.Random(semente)
+    for _ in range(quantidade):
+        yield aleatorio.choice(usuarios), aleatorio.randint(0, 10), aleatorio.choice(POOtrab.NIVEIS)
+
+def preparar_banco(args):
+    POOtrab.criar_tabelas()
+
+    with POOtrab.conectar() as db:
+        for lote in POOtrab.em_lotes(gerar_questoes(args.questoes, args.semente), LOTE_SEMENTE):
+            db.executemany(POOtrab.SQL_UPSERT_QUESTAO, lote)
+
+    usuarios = []
+    cadastros = []
+    for i in range(args.usuarios):
+        nome = f"bench{i}"
+        inicio = time.perf_counter()
+        usuario_id = POOtrab.registrar_usuario(nome, SENHA_PADRAO)
+        cadastros.append(("registrar_usuario", time.perf_counter() - inicio, "ok"))
+        usuarios.append((usuario_id, nome))
+
+    ids = [usuario_id for usuario_id, _ in usuarios]
+    with POOtrab.conectar() as db:
+        for lote in POOtrab.em_lotes(gerar_resultados(args.resultados, ids, args.semente), LOTE_SEMENTE):
+            db.executemany("INSERT INTO resultados (usuario_id, nota, nivel) VALUES (?, ?, ?)", lote)
+    POOtrab.reconstruir_estatisticas()
+    if args.particoes:
+        POOtrab.reparticionar(args.particoes)
+    return usuarios, cadastros
+
+# -----------------------------------
+# USUÁRIO SIMULADO
+# -----------------------------------
+def medir(medicoes, operacao, funcao, *args, **kwargs):
+    inicio = time.perf_counter()
+    situacao = "ok"
+    try:
+        return funcao(*args, **kwargs)
+    except sqlite3.OperationalError as erro:
+        situacao = "bloqueio" if "locked" in str(erro) else "erro"
+    except Exception:
+        situacao = "erro"
+    finally:
+        medicoes.append((operacao, time.perf_counter() - inicio, situacao))
+
+def simular_usuario(tarefa):
+    """Login e `testes` quizzes completos; devolve as medições."""
+    usuario_id, nome, testes, duravel, semente = tarefa
+    aleatorio = random.Random(semente)
+    medicoes = []
+
+    medir(medicoes, "login", POOtrab.autenticar, nome, SENHA_PADRAO)
+    for _ in range(testes):
+        nivel = aleatorio.choice((None,) + POOtrab.NIVEIS)
+        quiz = medir(medicoes, "gerar_quiz", POOtrab.gerar_quiz, nivel) or []
+        respostas = []
+        for questao in quiz:
+            letra = aleatorio.choice(POOtrab.LETRAS)
+            respostas.append((questao.id, letra, int(letra == questao.letra_correta), aleatorio.randint(500, 20000)))
+        nota = sum(r[2] for r in respostas)
+        medir(medicoes, "salvar_resultado", POOtrab.salvar_resultado,
+              usuario_id, nota, POOtrab.nivel_do_quiz(quiz), respostas, aguardar=duravel)
+        medir(medicoes, "ver_estatisticas", POOtrab.obter_estatisticas, usuario_id)
+    return medicoes
+
+def iniciar_processo(caminho_banco, custo_senha):
+    POOtrab.DB_PATH = caminho_banco
+    POOtrab.gerenciador_senhas.custo = custo_senha
+
+def simular_lote(tarefas):
+    # Executado dentro de um processo: a fila de resultados do processo
+    # precisa esvaziar antes de devolver, pois o worker não roda atexit
+    medicoes = [m for tarefa in tarefas for m in simular_usuario(tarefa)]
+    return medicoes, POOtrab.aguardar_gravacoes()
+
+# -----------------------------------
+# RELATÓRIO
+# -----------------------------------
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+def resumir(medicoes, duracao):
+    por_operacao = {}
+    for operacao, segundos, situacao in medicoes:
+        por_operacao.setdefault(operacao, []).append((segundos, situacao))
+
+    resumo = {}
+    for operacao, valores in sorted(por_operacao.items()):
+        tempos = sorted(segundos * 1000 for segundos, _ in valores)
+        resumo[operacao] = {
+            "chamadas": len(valores),
+            "erros": sum(1 for _, situacao in valores if situacao == "erro"),
+            "bloqueios": sum(1 for _, situacao in valores if situacao == "bloqueio"),
+            "por_segundo": len(valores) / duracao if duracao else None,
+            "media_ms": sum(tempos) / len(tempos),
+            "p50_ms": percentil(tempos, 50),
+            "p95_ms": percentil(tempos, 95),
+            "p99_ms": percentil(tempos, 99),
+            "max_ms": tempos[-1],
+        }
+    return resumo
+
+def imprimir(resumo, gravacao, duracao):
+    print("\n" + "="*86)
+    print(f"{'operação':<20}{'chamadas':>9}{'/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'erros':>8}{'bloq.':>8}")
+    print("="*86)
+    for operacao, r in resumo.items():
+        print(f"{operacao:<20}{r['chamadas']:>9}{r['por_segundo'] or 0:>10.1f}{r['p50_ms']:>10.2f}"
+              f"{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['erros']:>8}{r['bloqueios']:>8}")
+    print("="*86)
+    print(f"Duração: {duracao:.2f} s | lotes gravados: {gravacao['lotes']} | "
+          f"lotes perdidos: {gravacao['falhas']} | bloqueios na gravação: {gravacao['bloqueios']}")
+
+# -----------------------------------
+# EXECUÇÃO
+# -----------------------------------
+def executar(args):
+    usuarios, cadastros = preparar_banco(args)
+    tarefas = [
+        (usuario_id, nome, args.testes, args.duravel, args.semente + i)
+        for i, (usuario_id, nome) in enumerate(usuarios)
+    ]
+
+    inicio = time.perf_counter()
+    gravacao = {"lotes": 0, "falhas": 0, "bloqueios": 0}
+    if args.modo == "threads":
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            medicoes = [m for lista in executor.map(simular_usuario, tarefas) for m in lista]
+        gravacao = POOtrab.aguardar_gravacoes()
+    else:
+        lotes = [tarefas[i::args.workers] for i in range(args.workers)]
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=contexto,
+                                 initializer=iniciar_processo,
+                                 initargs=(POOtrab.DB_PATH, POOtrab.gerenciador_senhas.custo)) as executor:
+            medicoes = []
+            for parciais, contadores in executor.map(simular_lote, lotes):
+                medicoes.extend(parciais)
+                for chave, valor in contadores.items():
+                    gravacao[chave] += valor
+    duracao = time.perf_counter() - inicio
+
+    resumo = resumir(medicoes, duracao)
+    resumo.update(resumir(cadastros, None))
+    return resumo, gravacao, duracao
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carga simulada de usuários do Quiz Python")
+    parser.add_argument("--usuarios", type=int, default=50, help="usuários simulados")
+    parser.add_argument("--testes", type=int, default=20, help="quizzes por usuário")
+    parser.add_argument("--modo", choices=("threads", "processos"), default="threads")
+    parser.add_argument("--workers", type=int, default=8, help="threads ou processos simultâneos")
+    parser.add_argument("--questoes", type=int, default=1000, help="questões no banco (10^2 a 10^6)")
+    parser.add_argument("--resultados", type=int, default=10000, help="resultados pré-existentes")
+    parser.add_argument("--duravel", action="store_true",
+                        help="salvar_resultado espera o commit do lote (aguardar=True)")
+    parser.add_argument("--particoes", type=int, default=0,
+                        help="grava os resultados em N arquivos de partição (0 = banco único)")
+    parser.add_argument("--custo-senha", type=int, default=POOtrab.CUSTO_SENHA,
+                        help="parâmetro N do scrypt usado nos cadastros")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default=ARQUIVO_SAIDA, help="arquivo JSONL onde a execução é anexada")
+    args = parser.parse_args(argv)
+
+    POOtrab.gerenciador_senhas.custo = args.custo_senha
+    with tempfile.TemporaryDirectory(prefix="quiz-bench-") as pasta:
+        POOtrab.DB_PATH = str(Path(pasta) / "quizcode.db")
+        print(f"Banco temporário: {POOtrab.DB_PATH}")
+        print(f"Preparando {args.questoes} questões, {args.usuarios} usuários e {args.resultados} resultados...")
+        resumo, gravacao, duracao = executar(args)
+        POOtrab.fechar_conexoes()
+
+    imprimir(resumo, gravacao, duracao)
+
+    registro = {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "configuracao": {chave: valor for chave, valor in vars(args).items() if chave != "saida"},
+        "ambiente": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "sistema": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "duracao_s": duracao,
+        "gravacao": gravacao,
+        "operacoes": resumo,
+    }
+    with open(args.saida, "a", encoding="utf-8") as arquivo:
+        arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    print(f"✓ Resultado anexado a {args.saida}")
+
+if __name__ == "__main__":
+    main()
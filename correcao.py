@@ -0,0 +1,248 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import POOtrab
+
+# -----------------------------------
+# CONFIGURAÇÃO
+# -----------------------------------
+FOLHAS_POR_BLOCO = 20_000   # folhas enviadas de uma vez a cada processo
+BLOCOS_EM_ANDAMENTO = 2     # blocos pendentes por processo (limita a memória)
+
+# Códigos das letras: 0 é resposta em branco ou inválida
+CODIGO_LETRA = np.zeros(256, dtype=np.uint8)
+for _codigo, _letra in enumerate(POOtrab.LETRAS, 1):
+    CODIGO_LETRA[ord(_letra)] = CODIGO_LETRA[ord(_letra.lower())] = _codigo
+CODIGO_NIVEL = {nivel: codigo for codigo, nivel in enumerate(POOtrab.NIVEIS, 1)}
+MAIOR_ID = 2**63 - 1  # ids são INTEGER do SQLite (int64)
+
+# -----------------------------------
+# GABARITO
+# -----------------------------------
+def carregar_gabarito():
+    """Arrays indexados pelo id da questão: código da alternativa correta
+    (0 para ids sem questão) e código do nível."""
+    with POOtrab.conectar() as db:
+        linhas = db.execute("SELECT id, correta, nivel FROM questoes").fetchall()
+    tamanho = max((id_questao for id_questao, _, _ in linhas), default=0) + 1
+    gabarito = np.zeros(tamanho, dtype=np.uint8)
+    niveis = np.zeros(tamanho, dtype=np.uint8)
+    for id_questao, correta, nivel in linhas:
+        gabarito[id_questao] = CODIGO_LETRA[ord(correta[0])] if correta else 0
+        niveis[id_questao] = CODIGO_NIVEL.get(nivel, 0)
+    return gabarito, niveis
+
+# -----------------------------------
+# LEITURA DAS FOLHAS DE RESPOSTA
+# -----------------------------------
+def ler_blocos(caminho, tamanho=FOLHAS_POR_BLOCO):
+    """Gera blocos de linhas cruas; a interpretação fica com os processos.
+
+    Cada bloco é (arquivo, formato, cabeçalho CSV, número da primeira linha, linhas).
+    """
+    caminho = Path(caminho)
+    formato = "csv" if caminho.suffix.lower() == ".csv" else "jsonl"
+    with open(caminho, encoding="utf-8", newline="") as arquivo:
+        cabecalho = next(csv.reader([arquivo.readline()])) if formato == "csv" else None
+        numero = 2 if formato == "csv" else 1
+        for linhas in POOtrab.em_lotes(arquivo, tamanho):
+            yield caminho.name, formato, cabecalho, numero, linhas
+            numero += len(linhas)
+
+def interpretar(formato, cabecalho, linha):
+    """Devolve (usuário, ids das questões, letras escolhidas) de uma folha.
+
+    JSONL: {"usuario_id": 7, "questoes": [3, 18, 42], "respostas": "AC-"}
+    CSV:   usuario_id,questoes,respostas  →  7,3 18 42,AC-
+    O usuário pode vir por id (usuario_id) ou por nome (usuario). Letras
+    fora de A-D contam como resposta em branco.
+    """
+    if formato == "csv":
+        registro = dict(zip(cabecalho, next(csv.reader([linha]))))
+        questoes = registro.get("questoes", "").replace(";", " ").split()
+    else:
+        registro = json.loads(linha)
+        if not isinstance(registro, dict):
+            raise ValueError("a folha deve ser um objeto JSON")
+        questoes = registro.get("questoes") or []
+        if not isinstance(questoes, list):
+            raise ValueError("questoes deve ser uma lista")
+    respostas = registro.get("respostas") or ""
+    if not isinstance(respostas, str):
+        respostas = "".join(letra or "-" for letra in respostas)
+
+    if registro.get("usuario_id") not in (None, ""):
+        usuario = int(registro["usuario_id"])
+        if not 0 < usuario <= MAIOR_ID:
+            raise ValueError(f"usuario_id {usuario} fora do intervalo")
+    elif registro.get("usuario"):
+        usuario = str(registro["usuario"])
+    else:
+        raise ValueError("folha sem usuário")
+    if not questoes:
+        raise ValueError("folha sem questões")
+    if len(questoes) != len(respostas):
+        raise ValueError(f"{len(questoes)} questões e {len(respostas)} respostas")
+    ids = [int(q) for q in questoes]
+    if not all(0 < q <= MAIOR_ID for q in ids):
+        raise ValueError("id de questão fora do intervalo")
+    return usuario, ids, respostas
+
+# -----------------------------------
+# CORREÇÃO VETORIZADA (PROCESSOS)
+# -----------------------------------
+_gabarito = None
+_niveis = None
+
+def iniciar_processo(gabarito, niveis):
+    global _gabarito, _niveis
+    _gabarito, _niveis = gabarito, niveis
+
+def corrigir_bloco(bloco):
+    """Corrige um bloco de folhas; devolve (folhas, notas, níveis, erros).
+
+    `folhas` tem (arquivo, linha, usuário) de cada folha válida, alinhada com
+    os arrays de notas e níveis.
+
+    As respostas de todas as folhas do bloco viram um único array, comparado
+    de uma vez com o gabarito; np.add.reduceat soma os acertos de cada folha.
+    A nota é levada para a escala 0-10 dos quizzes.
+    """
+    nome, formato, cabecalho, primeiro, linhas = bloco
+    usuarios, questoes, letras, tamanhos, erros = [], [], [], [], []
+    for numero, linha in enumerate(linhas, primeiro):
+        if not linha.strip():
+            continue
+        try:
+            usuario, ids, respostas = interpretar(formato, cabecalho, linha)
+        except (ValueError, TypeError, KeyError, json.JSONDecodeError) as erro:
+            erros.append((nome, numero, str(erro)))
+            continue
+        usuarios.append((numero, usuario))
+        questoes.extend(ids)
+        letras.append(respostas)
+        tamanhos.append(len(ids))
+
+    if not usuarios:
+        return [], np.zeros(0, np.int64), np.zeros(0, np.uint8), erros
+
+    questoes = np.array(questoes, dtype=np.int64)
+    escolhas = CODIGO_LETRA[np.frombuffer("".join(letras).encode("ascii", "replace"), dtype=np.uint8)]
+    tamanhos = np.array(tamanhos, dtype=np.int64)
+    inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+
+    # Ids inexistentes invalidam a folha inteira
+    existe = (questoes > 0) & (questoes < len(_gabarito))
+    questoes = np.where(existe, questoes, 0)
+    corretas = _gabarito[questoes]
+    existe &= corretas > 0
+    validas = np.minimum.reduceat(existe.astype(np.uint8), inicios).astype(bool)
+
+    acertos = np.add.reduceat(((escolhas == corretas) & existe).astype(np.int64), inicios)
+    notas = np.rint(acertos * 10 / tamanhos).astype(np.int64)
+    niveis = _niveis[questoes]
+    nivel = np.where(np.minimum.reduceat(niveis, inicios) == np.maximum.reduceat(niveis, inicios),
+                     np.maximum.reduceat(niveis, inicios), 0).astype(np.uint8)
+
+    for (numero, _), valida in zip(usuarios, validas):
+        if not valida:
+            erros.append((nome, numero, "questão inexistente no banco"))
+    folhas = [(nome, numero, usuario) for (numero, usuario), valida in zip(usuarios, validas) if valida]
+    return folhas, notas[validas], nivel[validas], erros
+
+# -----------------------------------
+# GRAVAÇÃO
+# -----------------------------------
+class Correcao:
+    """Recebe os blocos corrigidos, na ordem dos arquivos, e grava em massa."""
+
+    def __init__(self):
+        self.corrigidas = 0
+        self.rejeitadas = 0
+        self.soma_notas = 0
+        self._ids_por_nome = None
+
+    def _resolver(self, usuarios):
+        if all(isinstance(u, int) for u in usuarios):
+            return usuarios
+        if self._ids_por_nome is None:
+            with POOtrab.conectar() as db:
+                self._ids_por_nome = dict(db.execute("SELECT usuario, id FROM usuarios"))
+        return [u if isinstance(u, int) else self._ids_por_nome.get(u) for u in usuarios]
+
+    def registrar(self, folhas, notas, niveis, erros):
+        nomes_nivel = (None,) + POOtrab.NIVEIS
+        ids = self._resolver([usuario for _, _, usuario in folhas])
+        linhas = []
+        origens = []
+        for (nome, numero, usuario), usuario_id, nota, nivel in zip(folhas, ids, notas.tolist(), niveis.tolist()):
+            if usuario_id is None:
+                erros.append((nome, numero, f"usuário '{usuario}' não cadastrado"))
+                continue
+            linhas.append((usuario_id, nota, nomes_nivel[nivel]))
+            origens.append((nome, numero))
+
+        # Folhas de uma partição que não pôde ser gravada contam como rejeitadas
+        for (nome, numero), resultado in zip(origens, POOtrab.gravar_resultados(linhas) if linhas else ()):
+            if resultado.erro:
+                erros.append((nome, numero, f"não gravada ({resultado.erro})"))
+            else:
+                self.corrigidas += 1
+                self.soma_notas += resultado.nota
+
+        for nome, numero, motivo in erros[:max(POOtrab.MAX_ERROS_EXIBIDOS - self.rejeitadas, 0)]:
+            print(f"\n✗ Folha ignorada ({nome}, linha {numero}): {motivo}")
+        self.rejeitadas += len(erros)
+
+def corrigir_arquivos(caminhos, processos=None, tamanho_bloco=FOLHAS_POR_BLOCO):
+    POOtrab.criar_tabelas()
+    gabarito, niveis = carregar_gabarito()
+    correcao = Correcao()
+    processos = processos or multiprocessing.cpu_count()
+    inicio = time.perf_counter()
+
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto,
+                             initializer=iniciar_processo, initargs=(gabarito, niveis)) as executor:
+        # Submete aos poucos e grava na ordem de leitura: a ordem dos
+        # resultados de cada usuário (média recente) segue a dos arquivos
+        pendentes = deque()
+        blocos = (bloco for caminho in caminhos for bloco in ler_blocos(caminho, tamanho_bloco))
+        for bloco in blocos:
+            pendentes.append(executor.submit(corrigir_bloco, bloco))
+            if len(pendentes) >= processos * BLOCOS_EM_ANDAMENTO:
+                correcao.registrar(*pendentes.popleft().result())
+                _mostrar_progresso(correcao, inicio)
+        while pendentes:
+            correcao.registrar(*pendentes.popleft().result())
+            _mostrar_progresso(correcao, inicio)
+
+    duracao = time.perf_counter() - inicio
+    media = correcao.soma_notas / correcao.corrigidas if correcao.corrigidas else 0
+    print(f"\n✓ {correcao.corrigidas} folhas corrigidas em {duracao:.1f} s "
+          f"(média {media:.1f}/10, {correcao.rejeitadas} rejeitadas)")
+    return correcao
+
+def _mostrar_progresso(correcao, inicio):
+    taxa = correcao.corrigidas / max(time.perf_counter() - inicio, 1e-9)
+    print(f"\r  {correcao.corrigidas} folhas corrigidas ({taxa:.0f}/s)", end="", flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Correção em lote de folhas de resposta do Quiz Python")
+    parser.add_argument("arquivos", nargs="+", help="folhas de resposta em JSONL ou CSV")
+    parser.add_argument("--processos", type=int, default=None, help="processos de correção (padrão: nº de CPUs)")
+    parser.add_argument("--bloco", type=int, default=FOLHAS_POR_BLOCO, help="folhas por bloco enviado a um processo")
+    args = parser.parse_args(argv)
+
+    corrigir_arquivos(args.arquivos, args.processos, args.bloco)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+import asyncio
+import argparse
+import json
+import mimetypes
+import secrets
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+import POOtrab
+
+# -----------------------------------
+# CONFIGURAÇÃO DO SERVIDOR
+# -----------------------------------
+RAIZ = Path(__file__).parent
+ARQUIVOS_ESTATICOS = ("index.html", "game.html", "result.html", "css/style.css", "css/result.css")
+
+THREADS_BANCO = 8             # limite de operações simultâneas no SQLite
+TEMPO_OCIOSO = 15             # segundos que uma conexão keep-alive pode ficar parada
+TAMANHO_MAX_CABECALHO = 16 * 1024
+TAMANHO_MAX_CORPO = 64 * 1024
+MAX_TOKENS = 200_000          # tokens de login guardados (LRU)
+TEMPO_TOKEN = 24 * 3600       # segundos sem uso até o token expirar
+
+class ErroHttp(Exception):
+    def __init__(self, status, mensagem=None):
+        super().__init__(mensagem or status.phrase)
+        self.status = status
+        self.mensagem = mensagem or status.phrase
+
+class Requisicao:
+    __slots__ = ("metodo", "caminho", "consulta", "cabecalhos", "corpo")
+
+    def __init__(self, metodo, alvo, cabecalhos, corpo):
+        partes = urlsplit(alvo)
+        self.metodo = metodo
+        self.caminho = partes.path
+        self.consulta = {chave: valores[-1] for chave, valores in parse_qs(partes.query).items()}
+        self.cabecalhos = cabecalhos
+        self.corpo = corpo
+
+    def json(self):
+        try:
+            dados = json.loads(self.corpo or b"{}")
+        except ValueError:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "corpo JSON inválido")
+        if not isinstance(dados, dict):
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "esperado um objeto JSON")
+        return dados
+
+class Tokens:
+    """Tokens de login com limite de quantidade (LRU) e expiração por ociosidade.
+
+    Só é usado pelo laço de eventos, então dispensa lock.
+    """
+
+    def __init__(self, max_tokens=MAX_TOKENS, tempo_ocioso=TEMPO_TOKEN):
+        self.max_tokens = max_tokens
+        self.tempo_ocioso = tempo_ocioso
+        self._tokens = OrderedDict()  # token -> (usuario_id, validade)
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def abrir(self, usuario_id):
+        token = secrets.token_urlsafe(24)
+        self._tokens[token] = (usuario_id, time.monotonic() + self.tempo_ocioso)
+        while len(self._tokens) > self.max_tokens:
+            self._tokens.popitem(last=False)
+        return token
+
+    def usuario(self, token):
+        """Id do usuário do token, ou None se não existe ou expirou."""
+        registro = self._tokens.get(token)
+        if registro is None:
+            return None
+        agora = time.monotonic()
+        if registro[1] < agora:
+            del self._tokens[token]
+            return None
+        self._tokens[token] = (registro[0], agora + self.tempo_ocioso)
+        self._tokens.move_to_end(token)
+        return registro[0]
+
+    def fechar(self, token):
+        self._tokens.pop(token, None)
+
+# -----------------------------------
+# SERVIDOR HTTP (ASYNCIO)
+# -----------------------------------
+class ServidorQuiz:
+    """API JSON do quiz sobre asyncio.
+
+    Cada conexão é atendida por uma corrotina (com keep-alive); o acesso ao
+    banco roda num pool limitado de threads, cada uma com sua conexão.
+    """
+
+    def __init__(self, threads=THREADS_BANCO):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="banco")
+        self.tokens = Tokens()
+        # Um lock por usuário serializa as mudanças na sessão (duas abas, retentativas);
+        # some sozinho quando nenhuma requisição do usuário o usa
+        self._locks_sessao = weakref.WeakValueDictionary()
+        self.estaticos = self._carregar_estaticos()
+        self.rotas = {
+            ("POST", "/api/cadastro"): self.cadastro,
+            ("POST", "/api/login"): self.login,
+            ("POST", "/api/logout"): self.logout,
+            ("GET", "/api/quiz"): self.novo_quiz,
+            ("GET", "/api/quiz/atual"): self.quiz_atual,
+            ("GET", "/api/questoes/busca"): self.buscar_questoes,
+            ("POST", "/api/resposta"): self.responder,
+            ("GET", "/api/estatisticas"): self.estatisticas,
+            ("GET", "/api/classificacao"): self.classificacao,
+            ("GET", "/api/consultas-lentas"): self.consultas_lentas,
+        }
+
+    @staticmethod
+    def _carregar_estaticos():
+        estaticos = {}
+        for nome in ARQUIVOS_ESTATICOS:
+            caminho = RAIZ / nome
+            if caminho.exists():
+                tipo = mimetypes.guess_type(nome)[0] or "application/octet-stream"
+                estaticos["/" + nome] = (caminho.read_bytes(), f"{tipo}; charset=utf-8")
+        if "/index.html" in estaticos:
+            estaticos["/"] = estaticos["/index.html"]
+        return estaticos
+
+    async def banco(self, funcao, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(funcao, *args, **kwargs))
+
+    # ---------- conexão ----------
+    async def atender(self, reader, writer):
+        try:
+            while True:
+                try:
+                    requisicao = await asyncio.wait_for(self._ler(reader), TEMPO_OCIOSO)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except ErroHttp as erro:
+                    writer.write(self._resposta(erro.status, {"erro": erro.mensagem}, manter=False))
+                    await writer.drain()
+                    break
+
+                manter = self._manter_conexao(requisicao)
+                status, conteudo, tipo = await self._despachar(requisicao)
+                writer.write(self._resposta(status, conteudo, tipo, manter))
+                await writer.drain()
+                if not manter:
+                    break
+        finally:
+            writer.close()
+
+    async def _ler(self, reader):
+        try:
+            bruto = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise ErroHttp(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+        linhas = bruto.decode("latin-1").split("\r\n")
+        try:
+            metodo, alvo, versao = linhas[0].split(" ", 2)
+        except ValueError:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "linha de requisição inválida")
+
+        cabecalhos = {"_versao": versao}
+        for linha in linhas[1:]:
+            if linha:
+                nome, _, valor = linha.partition(":")
+                cabecalhos[nome.strip().lower()] = valor.strip()
+
+        try:
+            tamanho = int(cabecalhos.get("content-length", 0))
+        except ValueError:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if tamanho < 0:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if tamanho > TAMANHO_MAX_CORPO:
+            raise ErroHttp(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        corpo = await reader.readexactly(tamanho) if tamanho else b""
+        return Requisicao(metodo.upper(), alvo, cabecalhos, corpo)
+
+    @staticmethod
+    def _manter_conexao(requisicao):
+        conexao = requisicao.cabecalhos.get("connection", "").lower()
+        if requisicao.cabecalhos["_versao"] == "HTTP/1.0":
+            return conexao == "keep-alive"
+        return conexao != "close"
+
+    async def _despachar(self, requisicao):
+        if requisicao.metodo == "GET" and requisicao.caminho in self.estaticos:
+            conteudo, tipo = self.estaticos[requisicao.caminho]
+            return HTTPStatus.OK, conteudo, tipo
+        if requisicao.metodo == "GET" and requisicao.caminho == "/metrics":
+            texto = POOtrab.exportar_metricas().encode("utf-8")
+            return HTTPStatus.OK, texto, "text/plain; version=0.0.4; charset=utf-8"
+
+        rota = self.rotas.get((requisicao.metodo, requisicao.caminho))
+        if rota is None:
+            return HTTPStatus.NOT_FOUND, {"erro": "rota não encontrada"}, None
+        try:
+            status, dados = await rota(requisicao)
+        except ErroHttp as erro:
+            return erro.status, {"erro": erro.mensagem}, None
+        except Exception as erro:
+            print(f"✗ Erro em {requisicao.metodo} {requisicao.caminho}: {erro!r}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"erro": "erro interno"}, None
+        return status, dados, None
+
+    @staticmethod
+    def _resposta(status, conteudo, tipo=None, manter=True):
+        if not isinstance(conteudo, bytes):
+            conteudo = json.dumps(conteudo, ensure_ascii=False).encode("utf-8")
+            tipo = "application/json; charset=utf-8"
+        cabecalhos = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {tipo}",
+            f"Content-Length: {len(conteudo)}",
+            "Cache-Control: no-store",
+        ]
+        if manter:
+            cabecalhos += ["Connection: keep-alive", f"Keep-Alive: timeout={TEMPO_OCIOSO}"]
+        else:
+            cabecalhos.append("Connection: close")
+        return ("\r\n".join(cabecalhos) + "\r\n\r\n").encode("latin-1") + conteudo
+
+    # ---------- autenticação ----------
+    @staticmethod
+    def _token(requisicao):
+        autorizacao = requisicao.cabecalhos.get("authorization", "")
+        return autorizacao[7:] if autorizacao.startswith("Bearer ") else ""
+
+    def _usuario(self, requisicao):
+        usuario_id = self.tokens.usuario(self._token(requisicao))
+        if usuario_id is None:
+            raise ErroHttp(HTTPStatus.UNAUTHORIZED, "faça login primeiro")
+        return usuario_id
+
+    @staticmethod
+    def _credenciais(requisicao):
+        dados = requisicao.json()
+        usuario = str(dados.get("usuario") or "").strip()
+        senha = str(dados.get("senha") or "").strip()
+        if not usuario or not senha:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "usuário e senha são obrigatórios")
+        return usuario, senha
+
+    def _abrir_sessao(self, usuario_id):
+        return self.tokens.abrir(usuario_id)
+
+    async def cadastro(self, requisicao):
+        usuario, senha = self._credenciais(requisicao)
+        senha_hash = await asyncio.wrap_future(POOtrab.gerenciador_senhas.gerar(senha))
+        usuario_id = await self.banco(POOtrab.inserir_usuario, usuario, senha_hash)
+        if usuario_id is None:
+            raise ErroHttp(HTTPStatus.CONFLICT, "usuário já existe")
+        return HTTPStatus.CREATED, {"usuario_id": usuario_id, "token": self._abrir_sessao(usuario_id)}
+
+    async def _autenticar(self, usuario, senha):
+        # Mesmo fluxo de POOtrab.autenticar, mas sem prender uma thread do
+        # banco enquanto o scrypt roda no pool de senhas
+        senhas = POOtrab.gerenciador_senhas
+        credencial = await self.banco(POOtrab.buscar_credencial, usuario)
+        if credencial is None:
+            await asyncio.wrap_future(senhas.verificar_ficticio(senha))
+            return None
+
+        usuario_id, armazenado = credencial
+        if senhas.em_cache(usuario_id, senha, armazenado):
+            return usuario_id
+
+        confere, novo_hash = await asyncio.wrap_future(senhas.verificar(senha, armazenado))
+        if not confere:
+            return None
+        if novo_hash:
+            novo = await asyncio.wrap_future(senhas.gerar(senha))
+            await self.banco(POOtrab.atualizar_hash_senha, usuario_id, armazenado, novo)
+            armazenado = novo
+        senhas.lembrar(usuario_id, senha, armazenado)
+        return usuario_id
+
+    async def login(self, requisicao):
+        usuario, senha = self._credenciais(requisicao)
+        usuario_id = await self._autenticar(usuario, senha)
+        if usuario_id is None:
+            raise ErroHttp(HTTPStatus.UNAUTHORIZED, "usuário ou senha inválidos")
+        return HTTPStatus.OK, {"usuario_id": usuario_id, "token": self._abrir_sessao(usuario_id)}
+
+    async def logout(self, requisicao):
+        self._usuario(requisicao)
+        self.tokens.fechar(self._token(requisicao))
+        return HTTPStatus.OK, {}
+
+    # ---------- quiz ----------
+    def _lock_sessao(self, usuario_id):
+        lock = self._locks_sessao.get(usuario_id)
+        if lock is None:
+            lock = self._locks_sessao[usuario_id] = asyncio.Lock()
+        return lock
+
+    async def _sessao(self, requisicao):
+        # O quiz fica na sessão do usuário, não do token: sobrevive a um novo login
+        usuario_id = self._usuario(requisicao)
+        return usuario_id, await self.banco(POOtrab.sessoes.obter, usuario_id)
+
+    @staticmethod
+    def _quiz_json(questoes, sessao):
+        respondidas = [questao_id for questao_id, _, _ in sessao.respostas_dadas()]
+        return {
+            "nivel": POOtrab.nivel_do_quiz(questoes),
+            "questoes": [
+                {"id": q.id, "pergunta": q.pergunta, "alternativas": list(q.alternativas), "nivel": q.nivel}
+                for q in questoes
+            ],
+            "respondidas": respondidas,
+        }
+
+    async def novo_quiz(self, requisicao):
+        async with self._lock_sessao(self._usuario(requisicao)):
+            return await self._novo_quiz(requisicao)
+
+    async def _novo_quiz(self, requisicao):
+        usuario_id, sessao = await self._sessao(requisicao)
+        if requisicao.consulta.get("refazer"):
+            if sessao.ultimo_quiz is None:
+                raise ErroHttp(HTTPStatus.CONFLICT, "nenhum quiz anterior para refazer")
+            questoes = await self.banco(POOtrab.questoes_por_ids, sessao.ultimo_quiz)
+        else:
+            nivel = requisicao.consulta.get("nivel") or None
+            if nivel and nivel not in POOtrab.NIVEIS:
+                raise ErroHttp(HTTPStatus.BAD_REQUEST, f"nível '{nivel}' inválido")
+            # ?repetir=1 sorteia sem considerar as questões já vistas
+            ineditas = None if requisicao.consulta.get("repetir") else usuario_id
+            questoes = await self.banco(POOtrab.gerar_quiz, nivel, ineditas)
+
+        sessao.iniciar_quiz(questoes)
+        await self.banco(POOtrab.sessoes.gravar, sessao)
+        return HTTPStatus.OK, self._quiz_json(questoes, sessao)
+
+    async def quiz_atual(self, requisicao):
+        _, sessao = await self._sessao(requisicao)
+        if sessao.quiz is None:
+            raise ErroHttp(HTTPStatus.NOT_FOUND, "nenhum quiz em andamento")
+        questoes = await self.banco(POOtrab.questoes_por_ids, sessao.quiz)
+        return HTTPStatus.OK, self._quiz_json(questoes, sessao)
+
+    async def buscar_questoes(self, requisicao):
+        self._usuario(requisicao)  # exige login
+        texto = (requisicao.consulta.get("q") or "").strip()
+        if not texto:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "informe o texto da busca em q")
+        try:
+            limite = min(max(int(requisicao.consulta.get("limite", 20)), 1), 100)
+        except ValueError:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "limite deve ser um número")
+        try:
+            questoes = await self.banco(POOtrab.buscar_questoes, texto, limite)
+        except POOtrab.BuscaIndisponivel as erro:
+            raise ErroHttp(HTTPStatus.SERVICE_UNAVAILABLE, str(erro))
+        return HTTPStatus.OK, {"questoes": questoes}
+
+    async def responder(self, requisicao):
+        async with self._lock_sessao(self._usuario(requisicao)):
+            return await self._responder(requisicao)
+
+    async def _responder(self, requisicao):
+        usuario_id, sessao = await self._sessao(requisicao)
+        if sessao.quiz is None:
+            raise ErroHttp(HTTPStatus.CONFLICT, "nenhum quiz em andamento")
+
+        dados = requisicao.json()
+        letra = str(dados.get("letra") or "").upper()
+        if letra not in POOtrab.LETRAS or len(letra) != 1:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "resposta deve ser A, B, C ou D")
+        tempo_ms = dados.get("tempo_ms")
+        questao_id = dados.get("questao_id")
+        try:
+            sessao.responder(questao_id, letra, tempo_ms if isinstance(tempo_ms, (int, float)) else None)
+        except ValueError as erro:
+            raise ErroHttp(HTTPStatus.CONFLICT, str(erro))
+
+        quiz = sessao.quiz
+        questoes = await self.banco(POOtrab.questoes_por_ids, quiz)
+        if sessao.quiz is not quiz:
+            raise ErroHttp(HTTPStatus.CONFLICT, "o quiz mudou durante a resposta")
+        por_id = {q.id: q for q in questoes}
+        respostas = [
+            (questao_id_dada, escolhida, int(escolhida == por_id[questao_id_dada].letra_correta), tempo)
+            for questao_id_dada, escolhida, tempo in sessao.respostas_dadas()
+            if questao_id_dada in por_id
+        ]
+        acertos = sum(r[2] for r in respostas)
+        questao = por_id.get(questao_id)
+        resposta = {
+            "correta": letra == questao.letra_correta if questao else False,
+            "letra_correta": questao.letra_correta if questao else None,
+            "acertos": acertos,
+            "respondidas": sessao.respondidas,
+            "total": len(quiz),
+            "concluido": False,
+        }
+
+        if sessao.respondidas == len(quiz):
+            nivel = POOtrab.nivel_do_quiz(questoes)
+            try:
+                await self.banco(POOtrab.salvar_resultado, usuario_id, acertos, nivel, respostas, aguardar=True)
+            except POOtrab.ErroGravacao as erro:
+                # A última resposta é desfeita: o cliente pode reenviá-la
+                sessao.desfazer(questao_id)
+                raise ErroHttp(HTTPStatus.SERVICE_UNAVAILABLE, str(erro))
+            # Só conclui depois que o resultado foi gravado
+            sessao.concluir()
+            await self.banco(POOtrab.sessoes.gravar, sessao)
+            resposta["concluido"] = True
+            resposta["nota"] = acertos
+            resposta["posicao"] = await self.banco(POOtrab.obter_posicao, usuario_id, nivel)
+        return HTTPStatus.OK, resposta
+
+    # ---------- estatísticas ----------
+    async def estatisticas(self, requisicao):
+        usuario_id = self._usuario(requisicao)
+        estatisticas = await self.banco(POOtrab.obter_estatisticas, usuario_id)
+        posicao = await self.banco(POOtrab.obter_posicao, usuario_id)
+        return HTTPStatus.OK, {"estatisticas": estatisticas, "posicao": posicao}
+
+    async def classificacao(self, requisicao):
+        nivel = requisicao.consulta.get("nivel") or None
+        janela = requisicao.consulta.get("janela") or "total"
+        if janela not in POOtrab.JANELAS:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, f"janela '{janela}' inválida")
+        try:
+            k = min(max(int(requisicao.consulta.get("k", 10)), 1), 100)
+        except ValueError:
+            raise ErroHttp(HTTPStatus.BAD_REQUEST, "k deve ser um número")
+        melhores = await self.banco(POOtrab.obter_classificacao, nivel, janela, k)
+        return HTTPStatus.OK, {"nivel": nivel, "janela": janela, "melhores": melhores}
+
+    async def consultas_lentas(self, requisicao):
+        return HTTPStatus.OK, {
+            "limite_segundos": POOtrab.LIMITE_CONSULTA_LENTA,
+            "consultas": list(POOtrab.metricas.consultas_lentas),
+        }
+
+# -----------------------------------
+# INICIALIZAÇÃO
+# -----------------------------------
+async def servir(host, porta, threads):
+    servidor_quiz = ServidorQuiz(threads)
+    servidor = await asyncio.start_server(
+        servidor_quiz.atender, host, porta, limit=TAMANHO_MAX_CABECALHO, backlog=1024,
+    )
+    print(f"✓ Servidor ouvindo em http://{host}:{porta}/")
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        servidor_quiz.executor.shutdown(wait=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP do Quiz Python")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--threads", type=int, default=THREADS_BANCO,
+                        help="threads dedicadas ao acesso ao banco")
+    args = parser.parse_args(argv)
+
+    print("Inicializando banco de dados...")
+    inicio = time.perf_counter()
+    POOtrab.criar_tabelas()
+    print(f"✓ Banco pronto em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    try:
+        asyncio.run(servir(args.host, args.porta, args.threads))
+    except KeyboardInterrupt:
+        print("\n👋 Servidor encerrado.")
+
+if __name__ == "__main__":
+    main()